@@ -1,14 +1,25 @@
 #!/usr/bin/env python3
 import os
 #
+import re
 import sys
 import csv
+import mmap
+import string
 import argparse
+from multiprocessing import Pool
 from pathlib import Path
-from rdkit import Chem
+
+_SAFE_CHARS = frozenset(string.ascii_letters + string.digits + "-_.")
+_SANITIZE_TABLE = str.maketrans({chr(c): "_" for c in range(128) if chr(c) not in _SAFE_CHARS})
 
 def sanitize(s: str) -> str:
-    return "".join(c if (c.isalnum() or c in "-_.") else "_" for c in s).strip("_") or "mol"
+    if s.isascii():
+        out = s.translate(_SANITIZE_TABLE)
+    else:
+        # non-ASCII names keep unicode letters/digits, as str.isalnum() does
+        out = "".join(c if (c.isalnum() or c in "-_.") else "_" for c in s)
+    return out.strip("_") or "mol"
 
 def next_unique_path(base: Path) -> Path:
     if not base.exists():
@@ -20,6 +31,16 @@ def next_unique_path(base: Path) -> Path:
             return cand
         k += 1
 
+def _unique_in(base: Path, existing: set) -> Path:
+    """Return the first of base, base_1, base_2, ... not already in existing (no stat() calls)."""
+    cand = base
+    k = 1
+    while cand.name in existing:
+        cand = base.with_name(f"{base.stem}_{k}{base.suffix}")
+        k += 1
+    existing.add(cand.name)
+    return cand
+
 def list_sdf(cwd: Path) -> list[Path]:
     return sorted([p for p in cwd.glob("*.sdf") if p.is_file()], key=lambda x: x.name.lower())
 
@@ -32,41 +53,122 @@ def choose_index(items, title):
         print("❌ Invalid selection.", file=sys.stderr); sys.exit(2)
     return items[int(s)-1]
 
-def split_sdf(input_sdf: Path, outdir: Path, prefix: str, pad: int, keep_names: bool) -> int:
-    suppl = Chem.SDMolSupplier(str(input_sdf))
-    if suppl is None:
-        print(f"❌ Could not read SDF: {input_sdf}", file=sys.stderr)
-        return 0
-
-    outdir.mkdir(parents=True, exist_ok=True)
-    manifest_path = outdir / "manifest.csv"
-    n = 0
-
-    with open(manifest_path, "w", newline="") as mf:
-        w = csv.writer(mf)
-        w.writerow(["index", "orig_name", "output_file"])
-        for i, mol in enumerate(suppl, start=1):
+SDF_DELIM = re.compile(rb"(?m)^\$\$\$\$\r?\n")
+
+# Bounds on one dispatched batch: enough records to amortise the Pool round
+# trip, few enough that the workers stay evenly loaded to the end of the file
+SPLIT_BATCH_RECORDS = 2000
+SPLIT_BATCH_BYTES = 8 << 20
+
+def _scan_offsets(path: Path) -> list[tuple[int, int]]:
+    """Return (start, end) byte ranges of every record in an SDF."""
+    spans = []
+    with open(path, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return spans
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            for m in SDF_DELIM.finditer(mm):
+                spans.append((start, m.end()))
+                start = m.end()
+            if mm[start:].strip():
+                spans.append((start, len(mm)))
+    return spans
+
+def _iter_batches(spans: list[tuple[int, int]], max_records: int, max_bytes: int):
+    """Group consecutive record spans into batches bounded by record count and input bytes."""
+    group = []
+    for span in spans:
+        if group and (len(group) >= max_records or span[1] - group[0][0] > max_bytes):
+            yield group
+            group = []
+        group.append(span)
+    if group:
+        yield group
+
+def _record_path(outdir: Path, prefix: str, pad: int, keep_names: bool, i: int, orig_name: str,
+                 existing: set) -> Path:
+    base_name = sanitize(orig_name) if keep_names else f"mol_{i:0{pad}d}"
+    # ensure uniqueness if a collision somehow occurs
+    return _unique_in(outdir / f"{prefix}{i:0{pad}d}_{base_name}.sdf", existing)
+
+def _write_chunk(job) -> list[tuple[int, str, str]]:
+    """Write the records of one batch of byte ranges, one record in memory at a time."""
+    input_sdf, outdir, prefix, pad, keep_names, validate, preexisting, first_index, group = job
+    # names are unique per record index, so only files already in outdir can collide
+    existing = set(preexisting)
+    rows = []
+    with open(input_sdf, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if not validate:
+            # each record is already a complete SDF block; copy the bytes verbatim
+            for i, (start, end) in enumerate(group, start=first_index):
+                eol = mm.find(b"\n", start, end)
+                orig_name = mm[start:eol if eol >= 0 else end].decode("utf-8", errors="replace").strip()
+
+                out_path = _record_path(outdir, prefix, pad, keep_names, i, orig_name, existing)
+                with open(out_path, "wb") as out_fh:
+                    out_fh.write(mm[start:end])
+                    if mm[end - 1:end] != b"\n":
+                        out_fh.write(b"\n")
+                rows.append((i, orig_name, out_path.name))
+            return rows
+
+        # RDKit is only needed for --validate; importing it lazily keeps the CLI fast
+        from rdkit import Chem
+
+        suppl = Chem.SDMolSupplier()
+        for i, (start, end) in enumerate(group, start=first_index):
+            # one record block per SetData, so only that record is decoded and parsed
+            suppl.SetData(mm[start:end].decode("utf-8", errors="replace"), sanitize=True)
+            mol = suppl[0]
             if mol is None:
                 continue
-            n += 1
 
             orig_name = mol.GetProp("_Name") if mol.HasProp("_Name") else f"mol_{i:0{pad}d}"
-            base_name = sanitize(orig_name) if keep_names else f"mol_{i:0{pad}d}"
+            out_path = _record_path(outdir, prefix, pad, keep_names, i, orig_name, existing)
+
+            with open(out_path, "w", buffering=1 << 20) as out_fh:
+                writer = Chem.SDWriter(out_fh)
+                writer.write(mol)
+                writer.close()
 
-            stem = f"{prefix}{i:0{pad}d}_{base_name}"
-            out_path = outdir / f"{stem}.sdf"
+            rows.append((i, orig_name, out_path.name))
+    return rows
 
-            # ensure uniqueness if a collision somehow occurs
-            if out_path.exists():
-                out_path = next_unique_path(out_path)
+def split_sdf(input_sdf: Path, outdir: Path, prefix: str, pad: int, keep_names: bool,
+              workers: int = 1, validate: bool = False) -> int:
+    try:
+        spans = _scan_offsets(input_sdf)
+    except OSError:
+        print(f"❌ Could not read SDF: {input_sdf}", file=sys.stderr)
+        return 0
 
-            writer = Chem.SDWriter(str(out_path))
-            writer.write(mol)
-            writer.close()
+    outdir.mkdir(parents=True, exist_ok=True)
+    manifest_path = outdir / "manifest.csv"
+
+    # bounded batches of consecutive records; record numbering stays global
+    preexisting = frozenset(entry.name for entry in os.scandir(outdir))
+    jobs = []
+    first_index = 1
+    for group in _iter_batches(spans, SPLIT_BATCH_RECORDS, SPLIT_BATCH_BYTES):
+        jobs.append((input_sdf, outdir, prefix, pad, keep_names, validate, preexisting, first_index, group))
+        first_index += len(group)
+
+    rows = []
+    workers = max(1, min(workers, len(jobs)))
+    if workers > 1:
+        with Pool(processes=workers) as pool:
+            for chunk_rows in pool.imap(_write_chunk, jobs):
+                rows.extend(chunk_rows)
+    else:
+        for job in jobs:
+            rows.extend(_write_chunk(job))
 
-            w.writerow([i, orig_name, out_path.name])
+    # written once at the end so a failed split never leaves a partial manifest
+    with open(manifest_path, "w", newline="", buffering=1 << 20) as mf:
+        csv.writer(mf).writerows([("index", "orig_name", "output_file"), *rows])
 
-    return n
+    return len(rows)
 
 def build_parser():
     ap = argparse.ArgumentParser(
@@ -81,6 +183,11 @@ def build_parser():
                     help="Use original _Name in filenames; else use mol_<index>.")
     ap.add_argument("--unique", action="store_true",
                     help="If output dir exists, append suffix (_1, _2, ...) to make a new dir.")
+    ap.add_argument("--validate", action="store_true",
+                    help="Parse and re-write every record with RDKit, dropping unreadable ones "
+                         "(default: copy record bytes verbatim).")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                    help="Parallel writer processes (default: all cores)")
     return ap
 
 def main():
@@ -127,7 +234,8 @@ def main():
             sys.exit(1)
 
     # 4) Split
-    count = split_sdf(input_sdf, outdir, args.prefix, args.pad, args.keep_names)
+    count = split_sdf(input_sdf, outdir, args.prefix, args.pad, args.keep_names,
+                      args.workers, args.validate)
     if count == 0:
         print("⚠️ No molecules were written (input may be empty/unreadable).", file=sys.stderr)
         sys.exit(1)
@@ -1,11 +1,13 @@
 #!/usr/bin/env python3
 
-import argparse, os, sys
+import argparse, io, os, sys
 import json
 import csv
 from pathlib import Path
 from datetime import datetime
 import re  # at top
+import fnmatch
+import string
 from typing import Dict, List, Optional, Tuple
 
 from hpc_profiles import packaged_profile_or_default, render_lsf_header, render_setup_block, replace_profile
@@ -19,14 +21,16 @@ set -euo pipefail
 echo "Submitting {N} jobs..."
 """
 
+_UNSAFE_NAME_RE = re.compile(r'[^A-Za-z0-9._-]+')
+
 def sanitize_name(p: str) -> str:
     # keep letters, digits, dot, underscore, dash; collapse everything else to "_"
-    return re.sub(r'[^A-Za-z0-9._-]+', '_', Path(p).name)
+    return _UNSAFE_NAME_RE.sub('_', Path(p).name)
 
 
 def parse_args():
     p = argparse.ArgumentParser(
-        description="Build per-target LSF jobs + a master submitter for 1_ConformerGeneration.py (CSV / folder of SDF|SMILES / single SDF / folder containing CSV)."
+        description="Build an LSF job array (or per-target LSF jobs) + a master submitter for 1_ConformerGeneration.py (CSV / folder of SDF|SMILES / single SDF / folder containing CSV)."
     )
     # Common knobs
     p.add_argument("--poses", type=int, default=64, help="Poses per molecule (default: 64)")
@@ -37,6 +41,10 @@ def parse_args():
     p.add_argument("--mem-per-core", default=str(DEFAULT_PROFILE.mem_per_core_mb), help=f"MB per core for rusage[mem=...] (default: {DEFAULT_PROFILE.mem_per_core_mb})")
     p.add_argument("--email", default=DEFAULT_PROFILE.email, help="Email for notifications")
     p.add_argument("--env-activate", default=DEFAULT_ENV, help="Shell line to activate conda/env")
+    p.add_argument("--max-concurrent", type=int, default=0,
+                   help="Max array elements running at once (LSF %%K throttle; 0 = no limit)")
+    p.add_argument("--no-array", action="store_true",
+                   help="Write one LSF script per target instead of a single job array")
     p.add_argument("--obabel-bin", default="", help="Path to obabel (optional). Empty → PATH/OBABEL_BIN.")
     p.add_argument("--enumerate-protomers", action="store_true",
                    help="Pass through to 1_ConformerGeneration.py to enumerate protonation states with Dimorphite-DL.")
@@ -64,22 +72,47 @@ def parse_args():
                    help="Auto-discover targets (mode=2 only): folders in the current directory containing ligand files for the selected --filetype.")
     return p.parse_args()
 
-def discover_folders(filetype: str) -> List[str]:
-    wanted_suffixes = {".sdf"} if filetype == "sdf" else {".smiles", ".smi"}
-    out = []
-    for d in sorted(Path(".").iterdir()):
-        if not d.is_dir():
+def _has_ext(d: Path, suffixes, recursive: bool = False) -> bool:
+    """True as soon as one file under d has a suffix in suffixes (case-insensitive)."""
+    stack = [d]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
             continue
-        if any(p.is_file() and p.suffix.lower() in wanted_suffixes for p in d.rglob("*")):
-            out.append(d.name)
-    return out
+        with it:
+            for entry in it:
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in suffixes:
+                    return True
+                if recursive and entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+    return False
+
+def _ligand_suffixes(filetype: str) -> set:
+    return {".sdf"} if filetype == "sdf" else {".smiles", ".smi"}
+
+_DISCOVERED: Dict[Tuple[str, str], List[str]] = {}
+
+def discover_folders(filetype: str) -> List[str]:
+    key = (os.getcwd(), filetype)
+    if key not in _DISCOVERED:
+        wanted_suffixes = _ligand_suffixes(filetype)
+        _DISCOVERED[key] = [
+            d.name for d in sorted(Path(".").iterdir())
+            if d.is_dir() and _has_ext(d, wanted_suffixes, recursive=True)
+        ]
+    return list(_DISCOVERED[key])
+
+def was_discovered(target: str, filetype: Optional[str]) -> bool:
+    """True if target came from discover_folders(filetype) in this run, i.e. is already validated."""
+    return target in _DISCOVERED.get((os.getcwd(), filetype), ())
 
 def discover_csv_folders() -> List[str]:
     out = []
     for d in sorted(Path(".").iterdir()):
         if not d.is_dir():
             continue
-        if any(d.glob("*.csv")):
+        if _has_ext(d, {".csv"}):
             out.append(d.name)
     return out
 
@@ -159,33 +192,36 @@ def list_with_indices(items: List[str], title: str):
     for i, name in enumerate(items, start=1):  # 1-based indices
         print(f" [{i}] {name}")
 
+_INDEX_TOKEN = re.compile(r"^\s*(\d+)\s*(?:-\s*(\d+)\s*)?$")
+
 def parse_index_list(s: str, n: int) -> List[int]:
     """
     Parse '1,3,5-7' into [1,3,5,6,7]; 1-based -> return zero-based indices.
     """
-    s = s.strip()
-    if not s:
-        return []
     picks = set()
+    for part in s.split(","):
+        m = _INDEX_TOKEN.match(part)
+        if not m:
+            continue
+        lo = int(m.group(1))
+        hi = int(m.group(2)) if m.group(2) else lo
+        if lo > hi: lo, hi = hi, lo
+        picks.update(k - 1 for k in range(max(lo, 1), min(hi, n) + 1))
+    return sorted(picks)
+
+def parse_selection(s: str, names: List[str]) -> List[int]:
+    """
+    Like parse_index_list, but tokens that are not indices are matched as
+    case-insensitive glob patterns against names, e.g. '1,CPD3*,*_split_00?'.
+    """
+    picks = set(parse_index_list(s, len(names)))
+    lowered = [name.lower() for name in names]
     for part in s.split(","):
         part = part.strip()
-        if not part:
+        if not part or _INDEX_TOKEN.match(part):
             continue
-        if "-" in part:
-            a, b = part.split("-", 1)
-            a, b = a.strip(), b.strip()
-            if not a.isdigit() or not b.isdigit():
-                continue
-            lo, hi = int(a), int(b)
-            if lo > hi: lo, hi = hi, lo
-            for k in range(lo, hi + 1):
-                if 1 <= k <= n:
-                    picks.add(k - 1)
-        else:
-            if part.isdigit():
-                k = int(part)
-                if 1 <= k <= n:
-                    picks.add(k - 1)
+        pattern = part.lower()
+        picks.update(i for i, name in enumerate(lowered) if fnmatch.fnmatchcase(name, pattern))
     return sorted(picks)
 
 def build_state_flags(args) -> str:
@@ -199,6 +235,8 @@ def build_state_flags(args) -> str:
     ]
     if args.enumerate_protomers:
         flags.append(" --enumerate-protomers")
+    # the job's -n cores are already used by --workers processes, so one MMFF thread each
+    flags.append(" --mmff-threads 1")
     return "".join(flags)
 
 def build_run_cmd(mode: str, target: str, poses: int, workers: int,
@@ -237,7 +275,8 @@ def build_run_cmd(mode: str, target: str, poses: int, workers: int,
             f" --mode 4 --folder \"{target}\"{csv_flags} --num-confs {poses} --workers {workers}{state_flags}\n"
         )
 
-def write_lsf(name: str, run_cmd: str, args) -> Path:
+def build_lsf_template(args) -> string.Template:
+    """Render the target-independent part of a confgen LSF script once; $jobname/$log_prefix/$run_cmd/$timestamp vary."""
     profile = replace_profile(
         DEFAULT_PROFILE,
         queue=args.queue,
@@ -249,12 +288,12 @@ def write_lsf(name: str, run_cmd: str, args) -> Path:
         setup_commands=args.env_activate,
     )
     obabel_line = f'export OBABEL_BIN="{args.obabel_bin}"\n' if args.obabel_bin.strip() else ""
-    text = (
-        f"#!/bin/bash\n# Auto-generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-        + render_lsf_header(
+    jobname_slot, log_slot = "\0J", "\0L"
+    body = (
+        render_lsf_header(
             profile=profile,
-            jobname=f"confgen_{name}",
-            log_prefix=f"confgen_{name}",
+            jobname=jobname_slot,
+            log_prefix=log_slot,
             walltime=args.walltime,
             workers=args.workers,
             mem_per_core_mb=args.mem_per_core,
@@ -262,18 +301,54 @@ def write_lsf(name: str, run_cmd: str, args) -> Path:
         + render_setup_block(profile)
         + f'PYBIN="{profile.python_command}"\nif [ -z "$PYBIN" ]; then\n  echo "❌ No Python interpreter found after activating env"; exit 127\nfi\necho "Using Python: $PYBIN"\n\n'
         + obabel_line
-        + run_cmd
+    )
+    # escape shell "$" so only our own placeholders are substituted
+    body = body.replace("$", "$$").replace(jobname_slot, "${jobname}").replace(log_slot, "${log_prefix}")
+    return string.Template("#!/bin/bash\n# Auto-generated: ${timestamp}\n" + body + "${run_cmd}")
+
+def write_lsf(name: str, run_cmd: str, args, template: Optional[string.Template] = None) -> Path:
+    template = template or build_lsf_template(args)
+    text = template.substitute(
+        timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        jobname=f"confgen_{name}",
+        log_prefix=f"confgen_{name}",
+        run_cmd=run_cmd,
     )
     out = HERE / f"run_confgen_{name}.lsf"
     out.write_text(text)
     return out
 
+def write_array_lsf(entries: List[Tuple[str, str]], args,
+                    template: Optional[string.Template] = None) -> Path:
+    """
+    Write ONE LSF job array covering every (target, run_cmd) entry.
+    Element $LSB_JOBINDEX runs the command of the matching target, so the
+    whole batch is a single bsub submission; --max-concurrent throttles it.
+    """
+    template = template or build_lsf_template(args)
+    n = len(entries)
+    throttle = f"%{args.max_concurrent}" if args.max_concurrent > 0 else ""
+    cases = ['case "$LSB_JOBINDEX" in\n']
+    for i, (target, run_cmd) in enumerate(entries, start=1):
+        cases.append(f'  {i})\n    echo "Target: {target}"\n    {run_cmd.rstrip()}\n    ;;\n')
+    cases.append('  *)\n    echo "❌ Unknown LSB_JOBINDEX=$LSB_JOBINDEX"; exit 2\n    ;;\nesac\n')
+    text = template.substitute(
+        timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        jobname=f'"confgen_array[1-{n}]{throttle}"',
+        log_prefix="confgen_array_%I",
+        run_cmd="".join(cases),
+    )
+    out = HERE / "run_confgen_array.lsf"
+    out.write_text(text)
+    return out
+
 def write_submitter(paths: List[Path]) -> Path:
     sh = HERE / "submit_all_confgen.sh"
-    lines = [SUBMITTER_HDR.format(N=len(paths))]
-    for p in paths:
-        lines.append(f'bsub < "{p.name}"')
-    sh.write_text("\n".join(lines) + "\n")
+    buf = io.StringIO()
+    buf.write(SUBMITTER_HDR.format(N=len(paths)) + "\n")
+    buf.writelines(f'bsub < "{p.name}"\n' for p in paths)
+    # bytes keep LF endings even when written from Windows onto a shared mount
+    sh.write_bytes(buf.getvalue().encode())
     os.chmod(sh, 0o755)
     return sh
 
@@ -326,14 +401,14 @@ def prompt_mode_block():
 
         list_with_indices(candidates, title="Available Directories:")
         if scope == "1":
-            s = input("Enter index of the directory to use: ").strip()
-            idxs = parse_index_list(s, len(candidates))
+            s = input("Enter index or name of the directory to use: ").strip()
+            idxs = parse_selection(s, candidates)
             if len(idxs) != 1:
                 print("❌ Please select exactly one index."); sys.exit(2)
             targets = [candidates[idxs[0]]]
         else:
-            s = input("Enter comma-separated indices (supports ranges, e.g., 1,3,5-7): ").strip()
-            idxs = parse_index_list(s, len(candidates))
+            s = input("Enter comma-separated indices or name patterns (e.g., 1,3,5-7,CPD3*): ").strip()
+            idxs = parse_selection(s, candidates)
             if not idxs:
                 print("❌ No indices selected."); sys.exit(2)
             targets = [candidates[i] for i in idxs]
@@ -360,15 +435,15 @@ def prompt_mode_block():
             list_with_indices(candidates, title="Available CSV Folders:")
         if scope == "1":
             if candidates:
-                s = input("Enter index of the folder to use, or type a path: ").strip()
-                idxs = parse_index_list(s, len(candidates))
+                s = input("Enter index or name of the folder to use, or type a path: ").strip()
+                idxs = parse_selection(s, candidates)
                 targets = [candidates[idxs[0]]] if len(idxs) == 1 else [s]
             else:
                 targets = [input("Folder path containing CSV: ").strip()]
         else:
             if candidates:
-                s = input("Enter comma-separated indices (supports ranges, e.g., 1,3,5-7), or type paths separated by commas: ").strip()
-                idxs = parse_index_list(s, len(candidates))
+                s = input("Enter comma-separated indices or name patterns (e.g., 1,3,5-7,CPD3*), or type paths separated by commas: ").strip()
+                idxs = parse_selection(s, candidates)
                 targets = [candidates[i] for i in idxs] if idxs else [x.strip() for x in s.split(",") if x.strip()]
             else:
                 s = input("Folder paths containing CSVs (comma-separated): ").strip()
@@ -429,22 +504,23 @@ def main():
                 print(f"⚠️ Skipping (not a CSV): {t}")
                 continue
         elif mode == "2":
+            if was_discovered(t, filetype):
+                valid.append(t)
+                continue
             if not p.is_dir():
                 print(f"⚠️ Skipping (not a directory): {t}")
                 continue
-            if filetype == "sdf" and not any(x.is_file() and x.suffix.lower() == ".sdf" for x in p.rglob("*")):
-                print(f"⚠️ Skipping (no .sdf in dir): {t}")
-                continue
-            if filetype == "smiles" and not any(
-                x.is_file() and x.suffix.lower() in {".smiles", ".smi"} for x in p.rglob("*")
-            ):
-                print(f"⚠️ Skipping (no .smiles or .smi in dir): {t}")
+            if filetype in ("sdf", "smiles") and not _has_ext(p, _ligand_suffixes(filetype), recursive=True):
+                if filetype == "sdf":
+                    print(f"⚠️ Skipping (no .sdf in dir): {t}")
+                else:
+                    print(f"⚠️ Skipping (no .smiles or .smi in dir): {t}")
                 continue
         elif mode == "4":
             if not p.is_dir():
                 print(f"⚠️ Skipping (not a directory): {t}")
                 continue
-            if not any(p.glob("*.csv")):
+            if not _has_ext(p, {".csv"}):
                 print(f"⚠️ Skipping (no .csv in dir): {t}")
                 continue
         else:
@@ -456,18 +532,27 @@ def main():
     if not valid:
         print("❌ No valid targets to build."); sys.exit(2)
 
-    # Build per-target LSF and master submitter
-    lsf_paths = []
+    # Build the job array (or per-target LSFs) and master submitter
+    entries = []
     for t in valid:
-        name = sanitize_name(t)
         target_smiles_col, target_id_col = csv_columns_for_target(t, csv_smiles_col, csv_id_col, csv_column_map)
         if mode in ("1", "4") and (not target_smiles_col or not target_id_col):
             print(f"❌ Missing CSV column settings for target: {t}")
             sys.exit(2)
         run_cmd = build_run_cmd(mode, t, args.poses, args.workers, filetype, target_smiles_col, target_id_col, args)
-        lsf = write_lsf(name, run_cmd, args)
+        entries.append((t, run_cmd))
+
+    lsf_template = build_lsf_template(args)
+    lsf_paths = []
+    if args.no_array:
+        for t, run_cmd in entries:
+            lsf = write_lsf(sanitize_name(t), run_cmd, args, lsf_template)
+            lsf_paths.append(lsf)
+            print(f"✅ Wrote {lsf.name}")
+    else:
+        lsf = write_array_lsf(entries, args, lsf_template)
         lsf_paths.append(lsf)
-        print(f"✅ Wrote {lsf.name}")
+        print(f"✅ Wrote {lsf.name} (job array of {len(entries)} targets)")
 
     submitter = write_submitter(lsf_paths)
     print(f"\n✅ Master submitter: {submitter.name}")
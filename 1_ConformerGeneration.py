@@ -1,12 +1,14 @@
 
 #!/usr/bin/env python3
-import os, sys, csv, shutil, subprocess
+import os, sys, csv, io, shutil, subprocess
 from pathlib import Path
 from datetime import datetime
-from multiprocessing import Pool, cpu_count
+from multiprocessing import Value, cpu_count
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import chain, islice
 import argparse
 import re
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 import numpy as np
 from rdkit import Chem
 from pathlib import Path
@@ -28,11 +30,29 @@ except Exception:
     protonate_smiles = None
     HAVE_DIMORPHITE = False
 
+try:
+    from meeko import MoleculePreparation
+    try:
+        from meeko import PDBQTWriterLegacy
+    except ImportError:  # meeko < 0.5
+        PDBQTWriterLegacy = None
+    HAVE_MEEKO = True
+except Exception:
+    MoleculePreparation = None
+    PDBQTWriterLegacy = None
+    HAVE_MEEKO = False
+
+# One /dev/null handle shared by every obabel child instead of a fresh open
+# per subprocess.run(..., stderr=DEVNULL). Children are started with
+# close_fds=False: our own fds are non-inheritable anyway (PEP 446), and it
+# lets CPython use posix_spawn/vfork rather than fork + walking the fd table.
+_DEVNULL = open(os.devnull, "wb")
+
 
 # ----------------- CLI -----------------
 def build_args():
     p = argparse.ArgumentParser(
-        description="Generate conformers → PDBQT with RDKit + OpenBabel. Interactive by default; flags enable headless."
+        description="Generate conformers → PDBQT with RDKit + Meeko or OpenBabel. Interactive by default; flags enable headless."
     )
     # Mode selection
     p.add_argument("--mode", choices=["1","2","3","4"],
@@ -44,6 +64,23 @@ def build_args():
     p.add_argument("--obabel-bin", help="Path to obabel (overrides PATH detection)")
     p.add_argument("--remove-tmp", action="store_true",
                help="Delete the TMP SDF folder at the end (default: keep TMP SDFs)")
+    p.add_argument("--pdbqt-writer", choices=["auto", "meeko", "obabel"], default="auto",
+                   help="Conformer -> PDBQT converter: in-process Meeko, or OpenBabel subprocesses "
+                        "(default auto: Meeko when installed)")
+    p.add_argument("--mmff-threads", type=int, default=1,
+                   help="Threads per worker for the batched MMFF94s optimization (default 1; 0 = all cores). "
+                        "Keep workers x threads within the cores you requested.")
+    p.add_argument("--prune-rms", type=float, default=0.5,
+                   help="RMSD (Å) below which embedded conformers are treated as duplicates (default 0.5)")
+    p.add_argument("--pin-workers", action="store_true",
+                   help="Pin each worker to one CPU of the job's allocation (Linux). Only use when this "
+                        "run owns its cores, e.g. an LSF job with affinity; ignored when --mmff-threads != 1")
+    p.add_argument("--max-heavy-atoms", type=int, default=150,
+                   help="Reject inputs with more heavy atoms than this before embedding "
+                        "(default 150; 0 = no limit). Rejections go to bad_mols.log")
+    p.add_argument("--dedupe", action="store_true",
+                   help="Skip input molecules whose canonical SMILES was already seen in the same input "
+                        "(default: one pose set per row/record)")
 
 
     # Mode 1 (CSV)
@@ -93,8 +130,12 @@ def obabel_path(cli_path: Optional[str]):
 
 
 
+# \w is Unicode-aware like str.isalnum, so non-ASCII letters are still kept.
+_UNSAFE_ID_RE = re.compile(r"[^\w.\-]")
+
+
 def sanitize_id(name: str) -> str:
-    safe = "".join(c if c.isalnum() or c in ("-", "_", ".") else "_" for c in (name or "ligand"))
+    safe = _UNSAFE_ID_RE.sub("_", name or "ligand")
     return safe.strip("_") or "ligand"
 
 
@@ -188,12 +229,33 @@ def write_manifest_for_outputs(pdbqt_dir: Path, rows: List[dict]) -> Optional[Pa
 
 
 
-def embed_and_optimize(mol: Chem.Mol, num_confs: int) -> Tuple[Chem.Mol, List[int]]:
+def optimize_conformers_batched(mol: Chem.Mol, num_threads: int = 1) -> None:
+    """
+    Optimize every conformer of mol in one RDKit call (MMFF94s, UFF fallback).
+    MMFF atom typing runs once: the same properties decide whether MMFF
+    applies and build the force field that every conformer reuses, spread
+    over num_threads threads (0 = all cores).
+    """
+    try:
+        props = AllChem.MMFFGetMoleculeProperties(mol, mmffVariant="MMFF94s")
+        if props is not None:
+            ff = AllChem.MMFFGetMoleculeForceField(mol, props)
+            AllChem.OptimizeMoleculeConfs(mol, ff, numThreads=int(num_threads), maxIters=200)
+        else:
+            AllChem.UFFOptimizeMoleculeConfs(mol, numThreads=int(num_threads), maxIters=200)
+    except Exception:
+        pass
+
+
+def embed_and_optimize(mol: Chem.Mol, num_confs: int,
+                       prune_rms: float = 0.5, mmff_threads: int = 1) -> Tuple[Chem.Mol, List[int]]:
     """
     Generate genuinely distinct RDKit conformers for one tautomer/protomer state.
 
     Fixes the duplicate-conformer bug caused by repeatedly calling
     EmbedMultipleConfs(..., numConfs=1) and then repacking stale conformer IDs.
+    Near-duplicates are pruned during embedding (prune_rms, Å) and the
+    survivors are optimized with MMFF94s in a single batched call.
     """
 
     # Keep largest connected fragment only
@@ -215,7 +277,7 @@ def embed_and_optimize(mol: Chem.Mol, num_confs: int) -> Tuple[Chem.Mol, List[in
     # Optional but useful: avoid near-identical conformers.
     # Lower value = keep more conformers; higher value = stricter pruning.
     try:
-        params.pruneRmsThresh = 0.25
+        params.pruneRmsThresh = float(prune_rms)
     except Exception:
         pass
 
@@ -228,16 +290,10 @@ def embed_and_optimize(mol: Chem.Mol, num_confs: int) -> Tuple[Chem.Mol, List[in
 
     accepted_conf_ids = []
 
-    for cid in conf_ids:
-        # Optimize best-effort
-        try:
-            try:
-                AllChem.UFFOptimizeMolecule(mol, confId=int(cid))
-            except Exception:
-                AllChem.MMFFOptimizeMolecule(mol, confId=int(cid))
-        except Exception:
-            pass
+    # Optimize best-effort, all conformers at once
+    optimize_conformers_batched(mol, mmff_threads)
 
+    for cid in conf_ids:
         # Geometry sanity check
         try:
             conf = mol.GetConformer(int(cid))
@@ -270,6 +326,80 @@ def embed_and_optimize(mol: Chem.Mol, num_confs: int) -> Tuple[Chem.Mol, List[in
 
 
 
+def meeko_pdbqt_string(mol: Chem.Mol) -> str:
+    """
+    Prepare a single-conformer, hydrogenated mol with Meeko and return its PDBQT
+    text (Gasteiger charges, non-polar H merged, macrocycles kept rigid).
+    """
+    prep = MoleculePreparation(rigid_macrocycles=True)
+    setups = prep.prepare(mol)
+    if PDBQTWriterLegacy is None:
+        return prep.write_pdbqt_string()
+    pdbqt, ok, err = PDBQTWriterLegacy.write_string(setups[0])
+    if not ok:
+        raise ValueError(err or "Meeko could not write PDBQT")
+    return pdbqt
+
+
+
+def split_pdbqt_models(text: str) -> Dict[str, str]:
+    """
+    Split multi-molecule obabel PDBQT output (MODEL/ENDMDL blocks) into
+    {title: single-molecule PDBQT}, keyed by each block's 'REMARK  Name =' line.
+    """
+    models: Dict[str, str] = {}
+    block: List[str] = []
+
+    def _store():
+        title = ""
+        for line in block:
+            if line.startswith("REMARK") and "Name =" in line:
+                title = line.split("=", 1)[1].strip()
+                break
+        if title:
+            models[title] = "".join(block)
+
+    for line in text.splitlines(keepends=True):
+        if line.startswith("MODEL"):
+            block = []
+        elif line.startswith("ENDMDL"):
+            _store()
+            block = []
+        else:
+            block.append(line)
+    if any(line.strip() for line in block):
+        _store()
+    return models
+
+
+def obabel_pdbqt_batch(obabel: str, conf_mol: Chem.Mol, variants: List[Tuple[str, int]]) -> Dict[str, str]:
+    """
+    Convert several conformers of one state to PDBQT with a single obabel
+    process (Gasteiger charges). The multi-record SDF goes in on stdin and
+    the PDBQT comes back on stdout, so nothing touches the disk. Each
+    conformer is titled with its variant name so outputs map back by name,
+    not position.
+    """
+    buf = io.StringIO()
+    writer = Chem.SDWriter(buf)
+    try:
+        for variant, cid in variants:
+            single = Chem.Mol(conf_mol, False, int(cid))
+            single.SetProp("_Name", variant)
+            writer.write(single)
+    finally:
+        writer.close()
+    proc = subprocess.run(
+        [obabel, "-isdf", "-opdbqt", "--partialcharge", "gasteiger"],
+        input=buf.getvalue().encode("utf-8"),
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=_DEVNULL,
+        close_fds=False,
+    )
+    return split_pdbqt_models(proc.stdout.decode("utf-8", errors="replace"))
+
+
 def pick_canonical_tautomer(mol: Chem.Mol,
                             max_tautomers: int = 32,
                             max_transforms: int = 200) -> Chem.Mol:
@@ -380,8 +510,9 @@ def crest_conformers(ligand_id: str, sdf_path: Path, tmp_dir: Path, num_confs: i
             ["obabel", "-ixyz", str(xyz_out), "-osdf",
              "-O", str(workdir / f"{ligand_id}_pose.sdf"), "-m"],
             check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
+            stdout=_DEVNULL,
+            stderr=_DEVNULL,
+            close_fds=False,
         )
     except subprocess.CalledProcessError:
         print(f"❌ Failed to convert CREST XYZ → SDF for {ligand_id}")
@@ -571,12 +702,56 @@ def enumerate_tautomers(
 # 4) REPLACE generate_poses()
 # =============================
 
+# Per-run arguments shared by every task; set once per worker by _init_worker
+# so they are not pickled again with each ligand.
+_WORKER_CTX: dict = {}
+
+
+def _pin_worker(counter) -> None:
+    """
+    Pin this worker to one CPU of the job's allowed set (round-robin by
+    start order) so the scheduler stops migrating it between cores.
+    """
+    if counter is None or not hasattr(os, "sched_setaffinity"):
+        return
+    with counter.get_lock():
+        slot = counter.value
+        counter.value += 1
+    allowed = sorted(os.sched_getaffinity(0))
+    try:
+        os.sched_setaffinity(0, {allowed[slot % len(allowed)]})
+    except OSError:
+        pass
+
+
+def _init_worker(outputs: Dict[str, Tuple[Path, Path]], num_confs: int, obabel: str, state_opts: dict,
+                 pin_counter=None):
+    global _WORKER_CTX
+    _pin_worker(pin_counter)
+    _WORKER_CTX = {
+        "outputs": outputs,
+        "num_confs": num_confs,
+        "obabel": obabel,
+        "state_opts": state_opts,
+    }
+
+
 def generate_poses(task):
     """
     task:
       (
-        ligand_id, molblock, tmp_dir, pdbqt_dir, num_confs, OBABEL, state_opts
+        output_key, ligand_id, payload_kind, payload, source_input, source_input_type,
+        source_ligand_id, source_record_index, source_record_name,
+        original_mol_name
       )
+
+    payload_kind is "mol_binary" (Mol.ToBinary() bytes), "molblock" or
+    "smiles"; SMILES are parsed here so CSV rows never need RDKit work in
+    the main process.
+
+    output_key selects the (tmp_dir, pdbqt_dir) pair registered with
+    _init_worker; num_confs, OBABEL and state_opts come from the same
+    worker context.
 
     Enumerates:
       protomer -> tautomer -> conformers
@@ -588,13 +763,10 @@ def generate_poses(task):
       ...
     """
     (
+        output_key,
         ligand_id,
-        molblock,
-        tmp_dir,
-        pdbqt_dir,
-        num_confs,
-        OBABEL,
-        state_opts,
+        payload_kind,
+        payload,
         source_input,
         source_input_type,
         source_ligand_id,
@@ -602,17 +774,34 @@ def generate_poses(task):
         source_record_name,
         original_mol_name,
     ) = task
+    tmp_dir, pdbqt_dir = _WORKER_CTX["outputs"][output_key]
+    num_confs = _WORKER_CTX["num_confs"]
+    OBABEL = _WORKER_CTX["obabel"]
+    state_opts = _WORKER_CTX["state_opts"]
 
-    lig_tmp_dir = tmp_dir / ligand_id
-    lig_tmp_dir.mkdir(exist_ok=True, parents=True)
     manifest_rows = []
 
-    # 1) Load molblock
-    mol = Chem.MolFromMolBlock(molblock, sanitize=True, removeHs=False)
+    # 1) Load molblock / SMILES
+    if payload_kind == "smiles":
+        mol = Chem.MolFromSmiles(payload)
+    elif payload_kind == "mol_binary":
+        mol = Chem.Mol(payload)
+        try:
+            Chem.SanitizeMol(mol)
+        except Exception:
+            mol = None
+    else:
+        mol = Chem.MolFromMolBlock(payload, sanitize=True, removeHs=False)
     if mol is None:
-        print(f"❌ {ligand_id}: could not parse molblock")
+        print(f"❌ {ligand_id}: could not parse {payload_kind}")
         return {"written": 0, "rows": manifest_rows}
 
+    # TMP SDFs are only written when they are kept; obabel reads from stdin
+    keep_tmp_sdf = state_opts.get("keep_tmp_sdf", True)
+    lig_tmp_dir = tmp_dir / ligand_id
+    if keep_tmp_sdf:
+        lig_tmp_dir.mkdir(exist_ok=True, parents=True)
+
     # 2) Rebuild via SMILES for consistency
     try:
         smiles = Chem.MolToSmiles(mol, isomericSmiles=True)
@@ -660,7 +849,12 @@ def generate_poses(task):
         for t_idx, tmol in enumerate(tautomers, start=1):
             # 5) Conformer generation per tautomer
             try:
-                conf_mol, conf_ids = embed_and_optimize(Chem.Mol(tmol), num_confs)
+                conf_mol, conf_ids = embed_and_optimize(
+                    Chem.Mol(tmol),
+                    num_confs,
+                    prune_rms=state_opts.get("prune_rms", 0.5),
+                    mmff_threads=state_opts.get("mmff_threads", 1),
+                )
                 print(f"[STATE] {ligand_id} p{p_idx:02d} t{t_idx:02d}: {len(conf_ids)}/{num_confs} conformers generated")
             except Exception as e:
                 print(f"⚠️ {ligand_id} p{p_idx:02d} t{t_idx:02d}: embed/opt failed: {e}")
@@ -671,12 +865,13 @@ def generate_poses(task):
 
             state_prefix = f"{ligand_id}_p{p_idx:02d}_t{t_idx:02d}"
             state_tmp_dir = lig_tmp_dir / state_prefix
-            state_tmp_dir.mkdir(exist_ok=True, parents=True)
+            if keep_tmp_sdf:
+                state_tmp_dir.mkdir(exist_ok=True, parents=True)
 
+            pending = []
             for c_idx, cid in enumerate(conf_ids, start=1):
                 ligand_variant = f"{state_prefix}_c{c_idx:03d}"
                 sdf_path = state_tmp_dir / f"{ligand_variant}.sdf"
-                mol2_path = state_tmp_dir / f"{ligand_variant}.mol2"
                 pdbqt_path = pdbqt_dir / f"{ligand_variant}.pdbqt"
                 manifest_kwargs = {
                     "ligand_base": ligand_id,
@@ -695,9 +890,11 @@ def generate_poses(task):
                     "tmp_sdf_file": str(sdf_path.relative_to(tmp_dir)),
                 }
 
-                # Write SDF conformer
+                # Write SDF conformer (only when TMP is kept: 5C reads these
+                # per-variant files)
                 try:
-                    Chem.MolToMolFile(conf_mol, str(sdf_path), confId=int(cid))
+                    if keep_tmp_sdf:
+                        Chem.MolToMolFile(conf_mol, str(sdf_path), confId=int(cid))
                 except Exception as e:
                     print(f"❌ {state_prefix}: failed writing conformer {c_idx}: {e}")
                     manifest_rows.append(
@@ -709,36 +906,47 @@ def generate_poses(task):
                     )
                     continue
 
-                # Convert SDF -> MOL2 with Gasteiger charges
-                try:
-                    subprocess.run(
-                        [OBABEL, "-isdf", str(sdf_path),
-                         "-omol2", "-O", str(mol2_path),
-                         "--partialcharge", "gasteiger"],
-                        check=True,
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL
-                    )
-                except subprocess.CalledProcessError:
-                    print(f"❌ OpenBabel failed (SDF→MOL2) for {state_prefix} c{c_idx:03d}")
-                    manifest_rows.append(
-                        build_ligand_state_metadata(
-                            **manifest_kwargs,
-                            generation_status="failed_mol2",
-                            generation_warning="OpenBabel failed during SDF to MOL2 conversion",
+                # Convert in-process with Meeko: no obabel fork/exec per conformer
+                if state_opts.get("pdbqt_writer") == "meeko":
+                    try:
+                        pdbqt_path.write_text(meeko_pdbqt_string(Chem.Mol(conf_mol, False, int(cid))))
+                        written += 1
+                        manifest_rows.append(
+                            build_ligand_state_metadata(
+                                **manifest_kwargs,
+                                generation_status="ok",
+                                generation_warning="",
+                            )
                         )
-                    )
-                    continue
+                        continue
+                    except Exception as e:
+                        print(f"⚠️ Meeko failed for {state_prefix} c{c_idx:03d} ({e}); falling back to OpenBabel")
+
+                pending.append((ligand_variant, cid, pdbqt_path, manifest_kwargs))
 
-                # Convert MOL2 -> PDBQT
+            # Convert every remaining conformer of this state with ONE obabel call
+            if pending:
                 try:
-                    subprocess.run(
-                        [OBABEL, "-imol2", str(mol2_path),
-                         "-opdbqt", "-O", str(pdbqt_path)],
-                        check=True,
-                        stdout=subprocess.DEVNULL,
-                        stderr=subprocess.DEVNULL
+                    models = obabel_pdbqt_batch(
+                        OBABEL, conf_mol, [(variant, cid) for variant, cid, _, _ in pending]
                     )
+                except Exception as e:
+                    print(f"❌ OpenBabel failed (SDF→PDBQT) for {state_prefix}: {e}")
+                    models = {}
+                for ligand_variant, _, pdbqt_path, manifest_kwargs in pending:
+                    pdbqt_text = models.get(ligand_variant)
+                    if not pdbqt_text:
+                        if models:
+                            print(f"❌ OpenBabel produced no PDBQT for {ligand_variant}")
+                        manifest_rows.append(
+                            build_ligand_state_metadata(
+                                **manifest_kwargs,
+                                generation_status="failed_pdbqt",
+                                generation_warning="OpenBabel failed during SDF to PDBQT conversion",
+                            )
+                        )
+                        continue
+                    pdbqt_path.write_text(pdbqt_text)
                     written += 1
                     manifest_rows.append(
                         build_ligand_state_metadata(
@@ -747,22 +955,6 @@ def generate_poses(task):
                             generation_warning="",
                         )
                     )
-                except subprocess.CalledProcessError:
-                    print(f"❌ OpenBabel failed (MOL2→PDBQT) for {state_prefix} c{c_idx:03d}")
-                    manifest_rows.append(
-                        build_ligand_state_metadata(
-                            **manifest_kwargs,
-                            generation_status="failed_pdbqt",
-                            generation_warning="OpenBabel failed during MOL2 to PDBQT conversion",
-                        )
-                    )
-                    continue
-                finally:
-                    try:
-                        if mol2_path.exists():
-                            mol2_path.unlink()
-                    except Exception:
-                        pass
 
     print(f"[OK] {ligand_id}: {written} total structures written → {pdbqt_dir}")
     return {"written": written, "rows": manifest_rows}
@@ -1000,7 +1192,7 @@ def iter_mols_from_sdf_file(sdf_path, obabel_bin="obabel"):
             ligand_id = ensure_unique_ligand_id(raw_id, seen, context=f"{sdf_path.name} record {idx}")
             yield {
                 "ligand_id": ligand_id,
-                "molblock": Chem.MolToMolBlock(m),
+                "mol_binary": m.ToBinary(),
                 "source_input": str(sdf_path),
                 "source_input_type": "sdf",
                 "source_ligand_id": ligand_id,
@@ -1071,20 +1263,20 @@ def iter_mols_from_smiles_folder(folder: Path):
             smiles = smi.read_text().strip()
         except Exception:
             continue
-        mol = Chem.MolFromSmiles(smiles)
-        if mol:
-            ligand_id = ensure_unique_ligand_id(ligand_id_from_source_file(smi), seen, context=smi.name)
-            mol = Chem.AddHs(mol)
-            yield {
-                "ligand_id": ligand_id,
-                "molblock": Chem.MolToMolBlock(mol),
-                "source_input": str(smi),
-                "source_input_type": "smiles",
-                "source_ligand_id": ligand_id,
-                "source_record_index": 1,
-                "source_record_name": "",
-                "original_mol_name": "",
-            }
+        if not smiles:
+            continue
+        # Parsed once, in the worker (generate_poses)
+        ligand_id = ensure_unique_ligand_id(ligand_id_from_source_file(smi), seen, context=smi.name)
+        yield {
+            "ligand_id": ligand_id,
+            "smiles": smiles,
+            "source_input": str(smi),
+            "source_input_type": "smiles",
+            "source_ligand_id": ligand_id,
+            "source_record_index": 1,
+            "source_record_name": "",
+            "original_mol_name": "",
+        }
 
 # ----------------- interactive helpers -----------------
 def choose(prompt, options):
@@ -1194,10 +1386,245 @@ def resolve_csv_path_from_folder(args) -> Path:
     return next(p for p in csv_files if p.name == pick)
 
 
+# Rows per task chunk when streaming a CSV. Each ligand takes seconds of
+# embedding, so chunks stay small enough to spread short CSVs over all workers.
+CSV_STREAM_CHUNKSIZE = 8
+
+
+def adaptive_chunksize(n_tasks: Optional[int], num_workers: int, num_confs: int) -> int:
+    """
+    Ligands per pool task. Aim for ~8 chunks per worker so the tail stays
+    balanced, never more than 16, and fewer as poses per ligand grow (each
+    ligand is then heavy enough that IPC no longer matters). n_tasks=None
+    means a stream of unknown length.
+    """
+    cap = max(1, min(16, 1024 // max(1, num_confs)))
+    if n_tasks is None:
+        return min(CSV_STREAM_CHUNKSIZE, cap)
+    return max(1, min(cap, n_tasks // (num_workers * 8)))
+
+
+def _task_payload(task: Dict[str, str]) -> Tuple[str, object]:
+    for kind in ("mol_binary", "smiles", "molblock"):
+        if kind in task:
+            return kind, task[kind]
+    raise KeyError(f"task {task.get('ligand_id')!r} has no molecule payload")
+
+
+def prefilter_reason(task: Dict[str, str], max_heavy_atoms: int) -> Optional[str]:
+    """
+    Cheap main-process check for inputs no worker could embed: parse
+    failures, valence errors, empty molecules and oversized ones.
+    Returns the rejection reason, or None when the task should run.
+    """
+    kind, payload = _task_payload(task)
+    try:
+        if kind == "smiles":
+            mol = Chem.MolFromSmiles(payload, sanitize=False)
+        elif kind == "mol_binary":
+            mol = Chem.Mol(payload)
+        else:
+            mol = Chem.MolFromMolBlock(payload, sanitize=False, removeHs=False)
+        if mol is None:
+            return f"could not parse {kind}"
+        Chem.SanitizeMol(mol)
+    except Exception as e:
+        return f"sanitization failed: {e}"
+    heavy = mol.GetNumHeavyAtoms()
+    if heavy == 0:
+        return "no heavy atoms"
+    if max_heavy_atoms and heavy > max_heavy_atoms:
+        return f"{heavy} heavy atoms > --max-heavy-atoms {max_heavy_atoms}"
+    return None
+
+
+def prefilter_tasks(tasks: Iterable[Dict[str, str]], rejected: List[Tuple[str, str, str]],
+                    max_heavy_atoms: int) -> Iterator[Dict[str, str]]:
+    """Yield runnable tasks; append (ligand_id, source, reason) for the rest to rejected."""
+    for task in tasks:
+        reason = prefilter_reason(task, max_heavy_atoms)
+        if reason is None:
+            yield task
+            continue
+        source = task["source_input"]
+        if task.get("source_record_index") not in ("", None):
+            source = f"{source}#{task['source_record_index']}"
+        print(f"🚫 {task['ligand_id']}: {reason} — skipped")
+        rejected.append((task["ligand_id"], source, reason))
+
+
+def write_bad_mols_log(pdbqt_dir: Path, rejected: List[Tuple[str, str, str]]) -> Optional[Path]:
+    if not rejected:
+        return None
+    log_path = pdbqt_dir / "bad_mols.log"
+    with open(log_path, "w") as fh:
+        fh.write("".join(f"{lig}\t{source}\t{reason}\n" for lig, source, reason in rejected))
+    print(f"🚫 {len(rejected)} input(s) rejected before embedding → {log_path}")
+    return log_path
+
+
+def canonical_task_smiles(task: Dict[str, str]) -> Optional[str]:
+    kind, payload = _task_payload(task)
+    try:
+        if kind == "smiles":
+            mol = Chem.MolFromSmiles(payload)
+        elif kind == "mol_binary":
+            mol = Chem.Mol(payload)
+        else:
+            mol = Chem.MolFromMolBlock(payload, sanitize=True, removeHs=False)
+        return Chem.MolToSmiles(Chem.RemoveHs(mol), isomericSmiles=True) if mol is not None else None
+    except Exception:
+        return None
+
+
+def dedupe_tasks(tasks: Iterable[Dict[str, str]]) -> Iterator[Dict[str, str]]:
+    """
+    Drop tasks whose canonical isomeric SMILES repeats an earlier one.
+    Unparseable inputs pass through so the worker still reports them.
+    """
+    seen: Set[str] = set()
+    for task in tasks:
+        canon = canonical_task_smiles(task)
+        if canon is not None:
+            if canon in seen:
+                print(f"♻️ {task['ligand_id']}: duplicate of an earlier input ({canon}) — skipped")
+                continue
+            seen.add(canon)
+        yield task
+
+
+def _generate_chunk(chunk: List[tuple]) -> List[Tuple[str, dict]]:
+    return [(task[0], generate_poses(task)) for task in chunk]
+
+
+def run_generation(tasks: Iterable[Dict[str, str]], outputs: Dict[str, Tuple[Path, Path]], num_confs: int,
+                   num_workers: int, OBABEL: str, state_opts: dict,
+                   chunksize: Optional[int] = None) -> Dict[str, Tuple[int, List[dict]]]:
+    """
+    Run generate_poses over tasks in one process pool.
+
+    outputs maps an output key to its (tmp_dir, pdbqt_dir); each task picks
+    one with its "output_key" (default ""). Returns
+    {output_key: (poses written, manifest rows)}.
+
+    tasks may be a generator: it is consumed lazily, with at most
+    2 * num_workers chunks in flight, so streamed inputs never sit in memory
+    all at once. chunksize defaults to adaptive_chunksize(len(tasks), ...).
+    """
+    if chunksize is None:
+        chunksize = adaptive_chunksize(len(tasks), num_workers, num_confs)
+    work_items = (
+        (
+            task.get("output_key", ""),
+            task["ligand_id"],
+            *_task_payload(task),
+            task["source_input"],
+            task["source_input_type"],
+            task["source_ligand_id"],
+            task.get("source_record_index", ""),
+            task.get("source_record_name", ""),
+            task.get("original_mol_name", ""),
+        )
+        for task in tasks
+    )
+    chunks = iter(lambda: list(islice(work_items, chunksize)), [])
+
+    written: Dict[str, int] = {key: 0 for key in outputs}
+    manifest_rows: Dict[str, List[dict]] = {key: [] for key in outputs}
+
+    def _collect(done):
+        for fut in done:
+            for key, result in fut.result():
+                written[key] += int((result or {}).get("written", 0))
+                manifest_rows[key].extend((result or {}).get("rows", []))
+
+    # Workers already fill the cores; keep OpenMP/MKL inside them single-threaded
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+    pin_counter = Value("i", 0) if state_opts.get("pin_workers") else None
+
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        initializer=_init_worker,
+        initargs=(outputs, num_confs, OBABEL, state_opts, pin_counter),
+    ) as executor:
+        pending = set()
+        for chunk in chunks:
+            pending.add(executor.submit(_generate_chunk, chunk))
+            if len(pending) >= 2 * num_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _collect(done)
+        _collect(pending)
+    return {key: (written[key], manifest_rows[key]) for key in outputs}
+
+
+def _with_output_key(tasks: Iterable[Dict[str, str]], key: str) -> Iterator[Dict[str, str]]:
+    for task in tasks:
+        yield dict(task, output_key=key)
+
+
+def _run_pipeline(jobs: List[Tuple[str, Iterable[Dict[str, str]], List[Tuple[str, str, str]]]],
+                  num_confs: int, num_workers: int, OBABEL: str, remove_tmp: bool,
+                  state_opts: dict) -> List[Tuple[int, Path]]:
+    """
+    Shared tail of every input mode: create the PDBQT/TMP dirs for each
+    (base_name, tasks, rejected) job, run all jobs through one pool, remove
+    TMP if asked, then write each job's manifest and bad_mols.log.
+
+    tasks may be a list or, for a streamed input, a lazy iterator (rejected
+    is then filled while the pool consumes it). Returns
+    (poses written, pdbqt_dir) per job.
+    """
+    tag = f"{num_confs}Poses"
+    outputs: Dict[str, Tuple[Path, Path]] = {}
+    streams = []
+    n_tasks: Optional[int] = 0
+
+    for key, (base_name, tasks, _) in enumerate(jobs):
+        key = str(key)
+        pdbqt_dir, tmp_dir = create_output_dirs(base_name, tag)
+        outputs[key] = (tmp_dir, pdbqt_dir)
+        if isinstance(tasks, list):
+            n_tasks = None if n_tasks is None else n_tasks + len(tasks)
+            print(f"🚀 {base_name}: {len(tasks)} molecules × {num_confs} poses")
+        else:
+            n_tasks = None
+            print(f"🚀 {base_name}: streaming molecules × {num_confs} poses")
+        print(f"📦 Output PDBQT: {pdbqt_dir}")
+        print(f"🗂  TMP SDF:     {tmp_dir} (will {'be removed' if remove_tmp else 'be KEPT'})")
+        streams.append(_with_output_key(tasks, key))
+
+    print(f"\n🚀 Generating poses using {num_workers} cores…")
+    results: Dict[str, Tuple[int, List[dict]]] = {}
+    try:
+        results = run_generation(
+            chain.from_iterable(streams), outputs, num_confs, num_workers, OBABEL, state_opts,
+            chunksize=adaptive_chunksize(n_tasks, num_workers, num_confs),
+        )
+    finally:
+        # 🧹 Only remove TMP if explicitly requested
+        if remove_tmp:
+            for tmp_dir, _ in outputs.values():
+                try:
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    print(f"🧹 TMP removed: {tmp_dir}")
+                except Exception as e:
+                    print(f"⚠️ Could not remove TMP dir {tmp_dir}: {e}", file=sys.stderr)
+
+    done = []
+    for key, (_, _, rejected) in enumerate(jobs):
+        _, pdbqt_dir = outputs[str(key)]
+        written_total, manifest_rows = results[str(key)]
+        print(f"\n✅ Done! {written_total} poses written to: {pdbqt_dir}")
+        write_manifest_for_outputs(pdbqt_dir, manifest_rows)
+        write_bad_mols_log(pdbqt_dir, rejected)
+        done.append((written_total, pdbqt_dir))
+    return done
+
+
 def run_csv_mode(csv_path: Path, args, num_confs: int, num_workers: int, OBABEL: str, state_opts: dict):
     base_name = csv_path.stem
 
-    tasks: List[Dict[str, str]] = []
     seen_csv_ids: Dict[str, int] = {}
     with open(csv_path, "r", newline="") as f:
         r = csv.DictReader(f)
@@ -1216,149 +1643,73 @@ def run_csv_mode(csv_path: Path, args, num_confs: int, num_workers: int, OBABEL:
             smi_col = choose_csv_column(headers, "Index of SMILES column?", 0)
             id_col = choose_csv_column(headers, "Index of ID column?", 1 if len(headers) > 1 else 0)
 
-        for row_index, row in enumerate(r, start=1):
-            smiles = (row.get(smi_col) or "").strip()
-            ligand_id = ensure_unique_ligand_id(
-                sanitize_id((row.get(id_col) or "").strip()),
-                seen_csv_ids,
-                context=f"{csv_path.name} row {row_index}",
-            )
-            if not smiles or not ligand_id:
-                continue
-            mol = Chem.MolFromSmiles(smiles)
-            if mol:
-                mol = Chem.AddHs(mol)
-                tasks.append(
-                    {
-                        "ligand_id": ligand_id,
-                        "molblock": Chem.MolToMolBlock(mol),
-                        "source_input": str(csv_path),
-                        "source_input_type": "csv",
-                        "source_ligand_id": ligand_id,
-                        "source_record_index": row_index,
-                        "source_record_name": "",
-                        "original_mol_name": "",
-                    }
+        # Rows are streamed to the workers, which parse the SMILES themselves.
+        def _rows():
+            for row_index, row in enumerate(r, start=1):
+                smiles = (row.get(smi_col) or "").strip()
+                ligand_id = ensure_unique_ligand_id(
+                    sanitize_id((row.get(id_col) or "").strip()),
+                    seen_csv_ids,
+                    context=f"{csv_path.name} row {row_index}",
                 )
+                if not smiles or not ligand_id:
+                    continue
+                yield {
+                    "ligand_id": ligand_id,
+                    "smiles": smiles,
+                    "source_input": str(csv_path),
+                    "source_input_type": "csv",
+                    "source_ligand_id": ligand_id,
+                    "source_record_index": row_index,
+                    "source_record_name": "",
+                    "original_mol_name": "",
+                }
 
-    if not tasks:
-        print("⚠️ No valid molecules found.")
-        sys.exit(2)
-
-    tag = f"{num_confs}Poses"
-    pdbqt_dir, tmp_dir = create_output_dirs(base_name, tag)
-
-    print(f"\n🚀 Generating {num_confs} poses for {len(tasks)} molecules using {num_workers} cores…")
-    print(f"📦 Output PDBQT: {pdbqt_dir}")
-    print(f"🗂  TMP SDF:     {tmp_dir} (will {'NOT ' if args.remove_tmp else ''}be removed at end)")
+        rejected: List[Tuple[str, str, str]] = []
+        tasks = prefilter_tasks(_rows(), rejected, args.max_heavy_atoms)
+        if args.dedupe:
+            tasks = dedupe_tasks(tasks)
+        first = next(tasks, None)
+        if first is None:
+            print("⚠️ No valid molecules found.")
+            sys.exit(2)
 
-    work_items = [
-        (
-            task["ligand_id"],
-            task["molblock"],
-            tmp_dir,
-            pdbqt_dir,
-            num_confs,
-            OBABEL,
-            state_opts,
-            task["source_input"],
-            task["source_input_type"],
-            task["source_ligand_id"],
-            task.get("source_record_index", ""),
-            task.get("source_record_name", ""),
-            task.get("original_mol_name", ""),
+        _run_pipeline(
+            [(base_name, chain([first], tasks), rejected)],
+            num_confs, num_workers, OBABEL, args.remove_tmp, state_opts,
         )
-        for task in tasks
-    ]
-
-    written_total = 0
-    manifest_rows: List[dict] = []
-    try:
-        with Pool(processes=num_workers) as pool:
-            for result in pool.imap_unordered(generate_poses, work_items, chunksize=1):
-                written_total += int((result or {}).get("written", 0))
-                manifest_rows.extend((result or {}).get("rows", []))
-    finally:
-        if args.remove_tmp:
-            try:
-                shutil.rmtree(tmp_dir, ignore_errors=True)
-                print(f"🧹 TMP removed: {tmp_dir}")
-            except Exception as e:
-                print(f"⚠️ Could not remove TMP dir {tmp_dir}: {e}", file=sys.stderr)
-
-    print(f"\n✅ Done! {written_total} poses written to: {pdbqt_dir}")
-    write_manifest_for_outputs(pdbqt_dir, manifest_rows)
 
 # ----------------- per-folder runner -----------------
-def run_one_folder(folder: Path, ft: str, num_confs: int, num_workers: int, OBABEL: str, remove_tmp: bool, state_opts: dict):
-    print(f"\n=== Processing folder: {folder} (type={ft}) ===")
+def collect_folder_tasks(folder: Path, ft: str) -> List[Dict[str, str]]:
+    if ft == "sdf":
+        return list(iter_mols_from_sdf_folder(folder))
+    return list(iter_mols_from_smiles_folder(folder))
 
-    tasks: List[Dict[str, str]] = []
-    base_name = folder.name
 
-    # Collect ligands from the folder
-    if ft == "sdf":
-        for task in iter_mols_from_sdf_folder(folder):
-            tasks.append(task)
-    else:
-        for task in iter_mols_from_smiles_folder(folder):
-            tasks.append(task)
-
-    if not tasks:
-        print(f"⚠️  No valid molecules found in {folder}. Skipping.")
-        return 0, None, None
-
-    # Create output dirs
-    tag = f"{num_confs}Poses"
-    pdbqt_dir, tmp_dir = create_output_dirs(base_name, tag)
-
-    print(f"🚀 Generating {num_confs} poses for {len(tasks)} molecules using {num_workers} cores…")
-    print(f"📦 Output PDBQT: {pdbqt_dir}")
-    print(f"🗂  TMP SDF:     {tmp_dir} (will {'be removed' if remove_tmp else 'be KEPT'})")
-
-    # # Build work items
-    # work_items = [
-    #     (ligand_id, molblock, tmp_dir, pdbqt_dir, num_confs, OBABEL)
-    #     for (ligand_id, molblock) in tasks
-    # ]
-    work_items = [
-        (
-            task["ligand_id"],
-            task["molblock"],
-            tmp_dir,
-            pdbqt_dir,
-            num_confs,
-            OBABEL,
-            state_opts,
-            task["source_input"],
-            task["source_input_type"],
-            task["source_ligand_id"],
-            task.get("source_record_index", ""),
-            task.get("source_record_name", ""),
-            task.get("original_mol_name", ""),
-        )
-        for task in tasks
-    ]
-
-    written_total = 0
-    manifest_rows: List[dict] = []
-    try:
-        with Pool(processes=num_workers) as pool:
-            for result in pool.imap_unordered(generate_poses, work_items, chunksize=1):
-                written_total += int((result or {}).get("written", 0))
-                manifest_rows.extend((result or {}).get("rows", []))
-    finally:
-        # 🧹 Only remove TMP if explicitly requested
-        if remove_tmp:
-            try:
-                shutil.rmtree(tmp_dir, ignore_errors=True)
-                print(f"🧹 TMP removed: {tmp_dir}")
-            except Exception as e:
-                print(f"⚠️ Could not remove TMP dir {tmp_dir}: {e}", file=sys.stderr)
+def run_folders(folders: List[Path], ft: str, num_confs: int, num_workers: int, OBABEL: str,
+                remove_tmp: bool, state_opts: dict, dedupe: bool = False,
+                max_heavy_atoms: int = 0) -> List[Tuple[int, Path]]:
+    """
+    Generate poses for several ligand folders through one shared pool.
+
+    Each folder keeps its own PDBQT/TMP dirs and manifest; returns
+    (poses written, pdbqt_dir) for every folder that had ligands.
+    """
+    jobs = []
+    for folder in folders:
+        print(f"\n=== Processing folder: {folder} (type={ft}) ===")
+        rejected: List[Tuple[str, str, str]] = []
+        tasks = list(prefilter_tasks(collect_folder_tasks(folder, ft), rejected, max_heavy_atoms))
+        if dedupe:
+            tasks = list(dedupe_tasks(tasks))
+        if not tasks:
+            print(f"⚠️  No valid molecules found in {folder}. Skipping.")
+            continue
+        jobs.append((folder.name, tasks, rejected))
 
-    print(f"✅ Done! {written_total} poses written to: {pdbqt_dir}")
-    write_manifest_for_outputs(pdbqt_dir, manifest_rows)
-    return written_total, pdbqt_dir, tmp_dir
+    if not jobs:
+        return []
+    return _run_pipeline(jobs, num_confs, num_workers, OBABEL, remove_tmp, state_opts)
 
 
 # ----------------- main -----------------
@@ -1395,7 +1746,16 @@ if __name__ == "__main__":
         print("   Install with: pip install dimorphite_dl")
         sys.exit(2)
 
+    if args.pdbqt_writer == "meeko" and not HAVE_MEEKO:
+        print("❌ --pdbqt-writer meeko requires meeko.")
+        print("   Install with: pip install meeko")
+        sys.exit(2)
+    pdbqt_writer = "meeko" if args.pdbqt_writer == "meeko" or (args.pdbqt_writer == "auto" and HAVE_MEEKO) else "obabel"
+    print(f"🧪 PDBQT writer: {pdbqt_writer}")
+
     state_opts = {
+        "pdbqt_writer": pdbqt_writer,
+        "keep_tmp_sdf": not args.remove_tmp,
         "enumerate_protomers": args.enumerate_protomers,
         "ph_min": args.ph_min,
         "ph_max": args.ph_max,
@@ -1403,6 +1763,9 @@ if __name__ == "__main__":
         "max_protomers": args.max_protomers,
         "max_tautomers": args.max_tautomers,
         "max_transforms": args.max_transforms,
+        "prune_rms": args.prune_rms,
+        "mmff_threads": args.mmff_threads,
+        "pin_workers": args.pin_workers and args.mmff_threads == 1,
     }
 
     # Interactive fallback if mode not provided
@@ -1454,16 +1817,15 @@ if __name__ == "__main__":
         if ft not in ("sdf","smiles"):
             print("❌ Invalid filetype for mode=2 (use sdf/smiles)."); sys.exit(1)
 
-        # Process each folder sequentially with same settings
+        # Process all folders through one shared pool with same settings
         total_written = 0
         outputs = []
-        for folder in folders:
-            written, pdbqt_dir, tmp_dir = run_one_folder(
-                folder, ft, num_confs, num_workers, OBABEL, args.remove_tmp, state_opts
-            )
+        for written, pdbqt_dir in run_folders(
+            folders, ft, num_confs, num_workers, OBABEL, args.remove_tmp, state_opts,
+            dedupe=args.dedupe, max_heavy_atoms=args.max_heavy_atoms,
+        ):
             total_written += written
-            if pdbqt_dir is not None:
-                outputs.append(pdbqt_dir)
+            outputs.append(pdbqt_dir)
 
         # Sort outputs for a clean summary print
         outputs = sorted(outputs, key=lambda p: str(p).lower())
@@ -1492,61 +1854,20 @@ if __name__ == "__main__":
             sdf_path = next(p for p in sdf_files if p.name == pick)
         base_name = sdf_path.stem
 
-        tasks: List[Dict[str, str]] = []
-        for task in iter_mols_from_sdf_file(sdf_path):
-            tasks.append(task)
+        rejected: List[Tuple[str, str, str]] = []
+        tasks: List[Dict[str, str]] = list(
+            prefilter_tasks(iter_mols_from_sdf_file(sdf_path), rejected, args.max_heavy_atoms)
+        )
+        if args.dedupe:
+            tasks = list(dedupe_tasks(tasks))
 
         if not tasks:
             print("⚠️ No valid molecules found."); sys.exit(2)
 
-        tag = f"{num_confs}Poses"
-        pdbqt_dir, tmp_dir = create_output_dirs(base_name, tag)
-
-        print(f"\n🚀 Generating {num_confs} poses for {len(tasks)} molecules using {num_workers} cores…")
-        print(f"📦 Output PDBQT: {pdbqt_dir}")
-        print(f"🗂  TMP SDF:     {tmp_dir} (will {'be removed' if args.remove_tmp else 'be KEPT'})")
-
-
-        # work_items = [(ligand_id, molblock, tmp_dir, pdbqt_dir, num_confs, OBABEL) for (ligand_id, molblock) in tasks]
-        work_items = [
-            (
-                task["ligand_id"],
-                task["molblock"],
-                tmp_dir,
-                pdbqt_dir,
-                num_confs,
-                OBABEL,
-                state_opts,
-                task["source_input"],
-                task["source_input_type"],
-                task["source_ligand_id"],
-                task.get("source_record_index", ""),
-                task.get("source_record_name", ""),
-                task.get("original_mol_name", ""),
-            )
-            for task in tasks
-        ]
-
-        written_total = 0
-        manifest_rows: List[dict] = []
-        try:
-            with Pool(processes=num_workers) as pool:
-                for result in pool.imap_unordered(generate_poses, work_items, chunksize=1):
-                    written_total += int((result or {}).get("written", 0))
-                    manifest_rows.extend((result or {}).get("rows", []))
-        finally:
-            print(f"🗂  TMP SDF:     {tmp_dir} (will {'be removed' if args.remove_tmp else 'be KEPT'})")
-            if args.remove_tmp:
-                shutil.rmtree(tmp_dir, ignore_errors=True)
-
-                try:
-                    shutil.rmtree(tmp_dir, ignore_errors=True)
-                    print(f"🧹 TMP removed: {tmp_dir}")
-                except Exception as e:
-                    print(f"⚠️ Could not remove TMP dir {tmp_dir}: {e}", file=sys.stderr)
-
-        print(f"\n✅ Done! {written_total} poses written to: {pdbqt_dir}")
-        write_manifest_for_outputs(pdbqt_dir, manifest_rows)
+        _run_pipeline(
+            [(base_name, tasks, rejected)],
+            num_confs, num_workers, OBABEL, args.remove_tmp, state_opts,
+        )
 
     else:
         print("❌ Invalid selection."); sys.exit(1)
@@ -1,6 +1,7 @@
 from pymol import cmd
 import csv
 import os
+import numpy as np
 
 # === CONFIGURATION ===
 receptor_dir = "./Receptors"
@@ -24,22 +25,20 @@ def center_this():
     load_next_receptor()
 
 def center_from_selection(receptor_name):
-    model = cmd.get_model("pocket")
-    if len(model.atom) == 0:
+    if cmd.count_atoms("pocket") == 0:
         print("❌ No atoms in selection 'pocket'")
         return
 
-    x, y, z = 0, 0, 0
-    for atom in model.atom:
-        x += atom.coord[0]
-        y += atom.coord[1]
-        z += atom.coord[2]
-    n = len(model.atom)
-    center = (x/n, y/n, z/n)
+    # get_coords hands back an (N, 3) array straight from PyMOL's core,
+    # without building a Python object per atom like get_model does.
+    # state=1 is get_model's default: multi-state receptors are centered on
+    # the first state, not averaged across every model.
+    coords = cmd.get_coords("pocket", state=1)
+    center = tuple(float(c) for c in np.asarray(coords, dtype=np.float64).mean(axis=0))
 
     with open(output_csv, "a", newline="") as f:
         writer = csv.writer(f)
-        writer.writerow([f"{receptor_name}.pdbqt", round(center[0], 3), round(center[1], 3), round(center[2], 3), 20])
+        writer.writerow([receptor_key(receptor_name), round(center[0], 3), round(center[1], 3), round(center[2], 3), 20])
 
     print(f"✅ Center for {receptor_name} written: {center}")
 
@@ -53,21 +52,28 @@ def load_next_receptor():
 
     fname = remaining_receptors.pop(0)
     filepath = os.path.join(receptor_dir, fname)
-    object_name = fname.replace(".pdbqt", "")
+    object_name = fname[:-len(".pdbqt")]
 
     cmd.reinitialize()
     cmd.load(filepath, object_name)
     current_receptor = object_name
     print(f"📌 Loaded {fname}. Please define a selection named 'pocket' and then run: center_this()")
 
+def receptor_key(pdb_id):
+    """CSV key for a receptor: always the file name including .pdbqt."""
+    pdb_id = pdb_id.strip()
+    return pdb_id if pdb_id.endswith(".pdbqt") else f"{pdb_id}.pdbqt"
+
 # === Prepare list of unprocessed receptors ===
-receptors = [f for f in os.listdir(receptor_dir) if f.endswith(".pdbqt")]
-processed = set()
+receptors = sorted(
+    e.name for e in os.scandir(receptor_dir) if e.is_file() and e.name.endswith(".pdbqt")
+)
+processed = frozenset()
 
 if os.path.exists(output_csv):
     with open(output_csv, "r") as f:
         reader = csv.DictReader(f)
-        processed = {row["PDB_ID"] for row in reader if "PDB_ID" in row}
+        processed = frozenset(receptor_key(row["PDB_ID"]) for row in reader if row.get("PDB_ID"))
 
 remaining_receptors = [f for f in receptors if f not in processed]
 
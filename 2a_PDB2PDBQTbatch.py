@@ -88,6 +88,8 @@ ARGUMENTS (most useful)
   --write-summary               Write HET summary (only if not PDBQT-only)
   --keep-clean-pdb              Save cleaned PDBs (only if not PDBQT-only)
   --browse                      Force opening a GUI folder picker at start (interactive only)
+  --workers N                   Parallel clean+convert workers (default 0 = all schedulable cores)
+  --adt-subprocess              Run ADT's prepare_receptor4 as a subprocess per file (default: in-process)
 
 HEADLESS DEFAULTS (when --headless is used)
   mode=batch, remove_het=all, remove_chains=none, pdbqt_only=True
@@ -105,8 +107,13 @@ import json
 import shutil
 import subprocess
 import argparse
+import importlib
 import importlib.util
+import contextlib
+import io
+import traceback
 from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
 # =========================
 # Dependencies
@@ -151,6 +158,11 @@ def parse_args():
     p.add_argument("--write-summary", action="store_true", help="Write HET summary (suppressed if --pdbqt-only)")
     p.add_argument("--keep-clean-pdb", action="store_true", help="Keep cleaned PDBs (suppressed if --pdbqt-only)")
 
+    p.add_argument("--workers", type=int, default=0,
+                   help="Parallel clean+convert workers (0 = all schedulable cores)")
+    p.add_argument("--adt-subprocess", action="store_true",
+                   help="Run ADT prepare_receptor4 as one subprocess per file instead of in-process")
+
     # NEW: force GUI folder picker
     p.add_argument("--browse", action="store_true", help="Open a GUI folder picker at start (interactive only)")
 
@@ -385,7 +397,8 @@ def clean_structure_to_pdb(in_path, out_pdb_path, residues_to_drop, chains_to_dr
                 continue
             new_chain = gemmi.Chain(chain.name)
             for res in chain:
-                if is_true_het(res, chain) and res.name.strip().upper() in res_drop:
+                # cheap set lookup first: is_true_het only runs for names we might drop
+                if res_drop and res.name.strip().upper() in res_drop and is_true_het(res, chain):
                     continue
                 new_chain.add_residue(res)
             if len(new_chain) > 0:
@@ -451,6 +464,139 @@ def load_per_file_config(path):
         norm[k] = {"remove_het": rm_het, "remove_chains": rm_ch}
     return norm
 
+def cpu_count_cgroup_aware():
+    """Respect cgroup/LSF limits; fall back to os.cpu_count()."""
+    try:
+        n = len(os.sched_getaffinity(0))
+    except Exception:
+        n = os.cpu_count() or 1
+    lsf_n = os.environ.get("LSB_DJOB_NUMPROC")
+    if lsf_n:
+        try:
+            n = min(n, int(lsf_n))
+        except ValueError:
+            pass
+    return max(1, n)
+
+_ADT_PREP = None  # prepare_receptor4 module, imported once per worker process
+
+def _load_adt_prep(prep_kind):
+    global _ADT_PREP
+    if _ADT_PREP is None:
+        if prep_kind == "adt_local":
+            adt_root = os.path.abspath("AutoDockTools_py3")
+            if adt_root not in sys.path:
+                sys.path.insert(0, adt_root)
+        _ADT_PREP = importlib.import_module("AutoDockTools.Utilities24.prepare_receptor4")
+    return _ADT_PREP
+
+def run_adt_in_process(prep_kind, prep_args, out_pdbqt):
+    """
+    Run prepare_receptor4.main() with prep_args as its argv inside this
+    process, so each worker pays the ADT/MolKit import once rather than one
+    interpreter start per file. Returns (ok, captured stdout+stderr).
+    Raises ImportError if ADT cannot be imported here.
+    """
+    prep = _load_adt_prep(prep_kind)
+    buf = io.StringIO()
+    saved_argv = sys.argv
+    sys.argv = ["prepare_receptor4.py", *prep_args]
+    try:
+        with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
+            prep.main()
+        ok = True
+    except SystemExit as e:
+        ok = e.code in (None, 0)
+    except Exception:
+        buf.write(traceback.format_exc())
+        ok = False
+    finally:
+        sys.argv = saved_argv
+    return ok and os.path.isfile(out_pdbqt), buf.getvalue()
+
+def convert_one(task):
+    """
+    Clean + convert one structure (runs in a worker process).
+    task = (fname, folder, output_dir, residues_to_remove, chains_to_remove,
+            altloc, prep_kind, prep_base, prep_env, keep_clean_pdb, adt_in_process)
+    Returns (fname, ok, messages); messages are printed by the parent in file order.
+    """
+    msgs = []
+    try:
+        return _convert_one(task, msgs)
+    except Exception as e:
+        # e.g. a missing preparer binary or a failed copy: fail this file, not the whole batch
+        msgs.append(f"❌ Failed conversion on {task[0]}: {e}")
+        return task[0], False, msgs
+
+def _convert_one(task, msgs):
+    (fname, folder, output_dir, residues_to_remove, chains_to_remove,
+     altloc, prep_kind, prep_base, prep_env, keep_clean_pdb, adt_in_process) = task
+    in_path = os.path.join(folder, fname)
+    base = os.path.splitext(fname)[0]
+    # full file name in the temp name: x.pdb and x.cif may now be cleaned at the same time
+    cleaned_pdb = os.path.join(".temp_cleaned_pdbs", fname + ".clean.pdb")
+
+    try:
+        clean_structure_to_pdb(in_path, cleaned_pdb, residues_to_remove, chains_to_remove, altloc_policy=altloc)
+        msgs.append(f"\n🧹 Cleaning {fname} → {os.path.basename(cleaned_pdb)}")
+    except Exception as e:
+        msgs.append(f"❌ Failed cleaning {fname}: {e}")
+        return fname, False, msgs
+
+    out_pdbqt = os.path.join(output_dir, base + ".converted.pdbqt")
+    # Build conversion command by backend
+    if prep_kind == "meeko":
+        # Meeko CLI expects --read_pdb/--write_pdbqt (or -i/--read_with_prody)
+        cmd = list(prep_base) + [
+            "--read_pdb", cleaned_pdb,
+            "--write_pdbqt", out_pdbqt
+        ]
+        # optional: you can add box or other params here if desired
+    elif prep_kind in ("adt_module", "adt_local", "mgltools"):
+        # ADT/MGL takes -r/-o and usually benefits from -A checkhydrogens
+        cmd = list(prep_base) + [
+            "-r", cleaned_pdb,
+            "-o", out_pdbqt,
+            "-A", "checkhydrogens"
+        ]
+    else:
+        raise RuntimeError(f"Unsupported preparer kind: {prep_kind}")
+
+    msgs.append(f"⚙️ Converting {fname} → {os.path.basename(out_pdbqt)}")
+    if adt_in_process and prep_kind in ("adt_module", "adt_local"):
+        try:
+            ok, output = run_adt_in_process(prep_kind, cmd[len(prep_base):], out_pdbqt)
+        except ImportError:
+            pass  # ADT not importable here: fall back to the subprocess below
+        else:
+            if ok:
+                msgs.append(f"✅ Saved: {out_pdbqt}")
+                if keep_clean_pdb and (not is_cif_name(fname)):
+                    shutil.copy2(cleaned_pdb, os.path.join(output_dir, base + ".clean.pdb"))
+                return fname, True, msgs
+            msgs.append(f"❌ Failed conversion on {fname} (in-process prepare_receptor4)")
+            if output.strip():
+                msgs.append("   " + output.strip()[-2000:].replace("\n", "\n   "))
+            return fname, False, msgs
+
+    env = prep_env if prep_env is not None else os.environ.copy()
+
+    try:
+        # preparer chatter would interleave across workers: drop stdout, keep stderr for failures
+        subprocess.run(cmd, check=True, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        msgs.append(f"✅ Saved: {out_pdbqt}")
+        # Optional artifacts if allowed
+        if keep_clean_pdb and (not is_cif_name(fname)):
+            shutil.copy2(cleaned_pdb, os.path.join(output_dir, base + ".clean.pdb"))
+        return fname, True, msgs
+    except subprocess.CalledProcessError as e:
+        msgs.append(f"❌ Failed conversion on {fname}: {e}")
+        err = (e.stderr or b"").decode(errors="ignore").strip()
+        if err:
+            msgs.append("   " + err[-2000:].replace("\n", "\n   "))
+        return fname, False, msgs
+
 # =========================
 # Main
 # =========================
@@ -727,55 +873,32 @@ def main():
             if interactive:
                 print()
 
-    # PROCESS
+    # PROCESS — every file is independent: clean + convert in parallel
     success = 0
     fail = 0
-    for fname in files:
-        in_path = os.path.join(folder, fname)
-        base = os.path.splitext(fname)[0]
-        cleaned_pdb = os.path.join(".temp_cleaned_pdbs", base + ".clean.pdb")
-        residues_to_remove, chains_to_remove = per_file_choices.get(fname, (set(), set()))
-
-        try:
-            clean_structure_to_pdb(in_path, cleaned_pdb, residues_to_remove, chains_to_remove, altloc_policy=args.altloc)
-            print(f"\n🧹 Cleaning {fname} → {os.path.basename(cleaned_pdb)}")
-        except Exception as e:
-            print(f"❌ Failed cleaning {fname}: {e}")
-            fail += 1
-            continue
-
-        out_pdbqt = os.path.join(output_dir, base + ".converted.pdbqt")
-        # Build conversion command by backend
-        if prep_kind == "meeko":
-            # Meeko CLI expects --read_pdb/--write_pdbqt (or -i/--read_with_prody)
-            cmd = list(prep_base) + [
-                "--read_pdb", cleaned_pdb,
-                "--write_pdbqt", out_pdbqt
-            ]
-            # optional: you can add box or other params here if desired
-        elif prep_kind in ("adt_module", "adt_local", "mgltools"):
-            # ADT/MGL takes -r/-o and usually benefits from -A checkhydrogens
-            cmd = list(prep_base) + [
-                "-r", cleaned_pdb,
-                "-o", out_pdbqt,
-                "-A", "checkhydrogens"
-            ]
+    keep_clean_pdb = (not args.pdbqt_only) and args.keep_clean_pdb
+    tasks = [
+        (fname, folder, output_dir, *per_file_choices.get(fname, (set(), set())),
+         args.altloc, prep_kind, prep_base, prep_env, keep_clean_pdb, not args.adt_subprocess)
+        for fname in files
+    ]
+    workers = min(len(tasks), args.workers if args.workers > 0 else cpu_count_cgroup_aware()) or 1
+    with contextlib.ExitStack() as stack:
+        if workers > 1:
+            print(f"\n🧵 Converting {len(tasks)} structure(s) with {workers} workers")
+            ex = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+            # map yields in file order as soon as each next result is ready,
+            # so messages stream out during the batch instead of at the end
+            results = ex.map(convert_one, tasks)
         else:
-            raise RuntimeError(f"Unsupported preparer kind: {prep_kind}")
-
-        env = prep_env if prep_env is not None else os.environ.copy()
-
-        try:
-            print(f"⚙️ Converting {fname} → {os.path.basename(out_pdbqt)}")
-            subprocess.run(cmd, check=True, env=env)
-            print(f"✅ Saved: {out_pdbqt}")
-            # Optional artifacts if allowed
-            if (not args.pdbqt_only) and args.keep_clean_pdb and (not is_cif_name(fname)):
-                shutil.copy2(cleaned_pdb, os.path.join(output_dir, base + ".clean.pdb"))
-            success += 1
-        except subprocess.CalledProcessError as e:
-            print(f"❌ Failed conversion on {fname}: {e}")
-            fail += 1
+            results = map(convert_one, tasks)
+        for _fname, ok, msgs in results:
+            for msg in msgs:
+                print(msg)
+            if ok:
+                success += 1
+            else:
+                fail += 1
 
     # Cleanup temp
     try:
@@ -3,10 +3,12 @@ from __future__ import annotations
 
 import sys
 import os
+import fnmatch
 import re
+import string
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 from hpc_profiles import packaged_profile_or_default, render_lsf_header, render_setup_block, replace_profile
 
@@ -24,9 +26,6 @@ def _ignore_candidate_dir(d: Path) -> bool:
     )
 
 # ---------- utilities ----------
-def all_dirs_sorted() -> List[Path]:
-    return sorted([p for p in Path(".").iterdir() if p.is_dir()], key=lambda x: x.name.lower())
-
 def _ligand_dir_rank(d: Path):
     name = d.name.lower()
     return (
@@ -44,92 +43,84 @@ def _receptor_dir_rank(d: Path):
         name,
     )
 
-def ligand_dirs_only() -> List[Path]:
+def scan_workspace() -> List[Path]:
+    """One scandir of the CWD: the candidate directories for both menus."""
+    # scandir's DirEntry already knows the entry type: no stat per entry
+    with os.scandir(".") as it:
+        return [Path(e.name) for e in it if e.is_dir() and not _ignore_candidate_dir(Path(e.name))]
+
+def ligand_dirs_only(candidates: Optional[List[Path]] = None) -> List[Path]:
     """
     Show directory names only, ranked so likely ligand output folders appear first.
     """
-    return sorted(
-        [
-            p for p in Path(".").iterdir()
-            if p.is_dir()
-            and not _ignore_candidate_dir(p)
-        ],
-        key=_ligand_dir_rank,
-    )
+    return sorted(scan_workspace() if candidates is None else candidates, key=_ligand_dir_rank)
 
-def receptor_dirs_only() -> List[Path]:
+def receptor_dirs_only(candidates: Optional[List[Path]] = None) -> List[Path]:
     """
     Show directory names only, ranked so likely receptor folders appear first.
     """
-    return sorted(
-        [
-            p for p in Path(".").iterdir()
-            if p.is_dir()
-            and not _ignore_candidate_dir(p)
-        ],
-        key=_receptor_dir_rank,
-    )
+    return sorted(scan_workspace() if candidates is None else candidates, key=_receptor_dir_rank)
 
 def list_files(pattern: str) -> List[Path]:
-    return sorted([p for p in Path(".").glob(pattern) if p.is_file()], key=lambda x: x.name.lower())
+    # DirEntry.is_file() answers from the scandir result (symlinks still followed)
+    with os.scandir(".") as it:
+        names = [e.name for e in it if fnmatch.fnmatchcase(e.name, pattern) and e.is_file()]
+    names.sort(key=str.lower)
+    return [Path(n) for n in names]
 
 def show_indexed(items: List[Path], title: str):
-    print(f"\n{title}")
-    for i, p in enumerate(items, start=1):
-        print(f" [{i}] {p.name}")
+    lines = ["", title]
+    lines.extend(f" [{i}] {p.name}" for i, p in enumerate(items, start=1))
+    # one write for the whole menu instead of a flush per line on a terminal
+    lines.append("")
+    sys.stdout.write("\n".join(lines))
 
-def parse_index_list(s: str, n: int) -> List[int]:
-    s = s.strip()
-    if not s:
-        return []
+# One "<int>" or "<int>-<int>" token per comma-separated field; fields that
+# do not match (text, "5-", "1-2-3") are skipped like the old split parser did.
+_INDEX_TOKEN_RE = re.compile(r"(?:^|,)\s*(\d+)\s*(?:-\s*(\d+)\s*)?(?=,|$)")
 
+def parse_index_list(s: str, n: int) -> List[int]:
     picks = set()
-    for part in s.split(","):
-        part = part.strip()
-        if not part:
-            continue
-
-        if "-" in part:
-            a, b = part.split("-", 1)
-            if a.strip().isdigit() and b.strip().isdigit():
-                lo, hi = int(a), int(b)
-                if lo > hi:
-                    lo, hi = hi, lo
-                for k in range(lo, hi + 1):
-                    if 1 <= k <= n:
-                        picks.add(k - 1)
-        else:
-            if part.isdigit():
-                k = int(part)
-                if 1 <= k <= n:
-                    picks.add(k - 1)
-
+    for m in _INDEX_TOKEN_RE.finditer(s):
+        lo = int(m.group(1))
+        hi = int(m.group(2)) if m.group(2) is not None else lo
+        if lo > hi:
+            lo, hi = hi, lo
+        picks.update(range(max(lo, 1) - 1, min(hi, n)))
     return sorted(picks)
 
+def parse_single_index(s: str, n: int) -> Optional[int]:
+    """0-based index for a prompt that needs exactly one pick, else None."""
+    s = s.strip()
+    if s.isascii() and s.isdigit():
+        i = int(s)
+        return i - 1 if 1 <= i <= n else None
+    # "3-3", " 3," and the like still resolve through the full parser
+    idxs = parse_index_list(s, n)
+    return idxs[0] if len(idxs) == 1 else None
+
 def input_default(prompt: str, default):
     s = input(f"{prompt} [{default}]: ").strip()
     return s if s else str(default)
 
+_LIGAND_TAG_RE = re.compile(r"^Ligands_CPD(\d+)_Ligands")
+
 def ligand_tag(name: str) -> str:
-    m = re.match(r"^Ligands_CPD(\d+)_Ligands", name)
+    m = _LIGAND_TAG_RE.match(name)
     return f"CPD{m.group(1)}" if m else name
 
 def receptor_tag(name: str) -> str:
     return name[len("Receptors_"):] if name.startswith("Receptors_") else name
 
-def write_lsf(
-    jobtag: str,
-    receptors: str,
-    ligands: str,
-    centers_csv: str,
-    poses: int,
+def build_lsf_template(
     queue: str,
     project: str,
     walltime: str,
     workers: int,
     mem_per_core: int,
     email: str
-) -> Path:
+) -> string.Template:
+    """Render the job-independent part of a Vina LSF script once; $jobname/$log_prefix/$run_cmd/$timestamp vary."""
     profile = replace_profile(
         DEFAULT_PROFILE,
         queue=queue,
@@ -140,12 +131,12 @@ def write_lsf(
         email=email,
     )
     vina_pin = f'export VINA_EXE="{profile.vina_executable}"\n' if profile.vina_executable else ""
-    txt = (
-        f"#!/bin/bash\n# Auto-generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-        + render_lsf_header(
+    jobname_slot, log_slot = "\0J", "\0L"
+    body = (
+        render_lsf_header(
             profile=profile,
-            jobname=f"vina_{jobtag}",
-            log_prefix=f"vina_{jobtag}",
+            jobname=jobname_slot,
+            log_prefix=log_slot,
             walltime=walltime,
             workers=workers,
             mem_per_core_mb=mem_per_core,
@@ -153,26 +144,97 @@ def write_lsf(
         + render_setup_block(profile)
         + vina_pin
         + f'PYBIN="{profile.python_command}"\nif [ -z "$PYBIN" ]; then\n  echo "No Python command configured"; exit 127\nfi\n'
-        + '"$PYBIN" 3_Complete_batch_docking.py \\\n'
+    )
+    # escape shell "$" so only our own placeholders are substituted
+    body = body.replace("$", "$$").replace(jobname_slot, "${jobname}").replace(log_slot, "${log_prefix}")
+    return string.Template("#!/bin/bash\n# Auto-generated: ${timestamp}\n" + body + "${run_cmd}")
+
+def vina_command(receptors: str, ligands: str, centers_csv: str, poses: int) -> str:
+    return (
+        '"$PYBIN" 3_Complete_batch_docking.py \\\n'
         + f'  --receptors "{receptors}" \\\n'
         + f'  --ligands   "{ligands}" \\\n'
         + f'  --centers_csv "{centers_csv}" \\\n'
         + f"  --poses {poses}\n"
     )
+
+def write_lsf(
+    jobtag: str,
+    receptors: str,
+    ligands: str,
+    centers_csv: str,
+    poses: int,
+    queue: str,
+    project: str,
+    walltime: str,
+    workers: int,
+    mem_per_core: int,
+    email: str,
+    template: Optional[string.Template] = None,
+) -> Path:
+    template = template or build_lsf_template(queue, project, walltime, workers, mem_per_core, email)
+    txt = template.substitute(
+        timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        jobname=f"vina_{jobtag}",
+        log_prefix=f"vina_{jobtag}",
+        run_cmd=vina_command(receptors, ligands, centers_csv, poses),
+    )
     out = HERE / f"run_vina_{jobtag}.lsf"
     out.write_text(txt)
     return out
 
+VINA_ARRAY_MAX_CONCURRENT = 16
+
+def write_jobs_table(jobs: List[Tuple[str, str, str, str]]) -> Path:
+    """Write vina_jobs.tsv (header + one row per array element) for run_vina_array.lsf."""
+    out = HERE / "vina_jobs.tsv"
+    rows = ["idx\treceptor_dir\tligand_dir\tcenters_csv\n"]
+    rows.extend(
+        f"{i}\t{receptors}\t{ligands}\t{centers_csv}\n"
+        for i, (_jobtag, receptors, ligands, centers_csv) in enumerate(jobs, start=1)
+    )
+    out.write_text("".join(rows))
+    return out
+
+def write_array_lsf(
+    jobs: List[Tuple[str, str, str, str]],
+    poses: int,
+    template: string.Template,
+    max_concurrent: int = VINA_ARRAY_MAX_CONCURRENT,
+) -> Path:
+    """
+    Write ONE LSF job array covering every (receptor_dir, ligand_dir) pair.
+    Element $LSB_JOBINDEX reads row $LSB_JOBINDEX of vina_jobs.tsv, so the
+    whole batch is a single bsub submission.
+    """
+    table = write_jobs_table(jobs)
+    n = len(jobs)
+    throttle = f"%{max_concurrent}" if max_concurrent > 0 else ""
+    run_cmd = (
+        f'ROW="$(awk -F \'\\t\' -v i="$LSB_JOBINDEX" \'NR == i + 1\' "{table.name}")"\n'
+        'if [ -z "$ROW" ]; then\n'
+        f'  echo "❌ No row for LSB_JOBINDEX=$LSB_JOBINDEX in {table.name}"; exit 2\n'
+        'fi\n'
+        "IFS=$'\\t' read -r IDX RDIR LDIR CSV <<< \"$ROW\"\n"
+        'echo "Receptors: $RDIR | Ligands: $LDIR | Centers: $CSV"\n'
+        + vina_command("$RDIR", "$LDIR", "$CSV", poses)
+    )
+    txt = template.substitute(
+        timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        jobname=f'"vina[1-{n}]{throttle}"',
+        log_prefix="vina_array_%I",
+        run_cmd=run_cmd,
+    )
+    out = HERE / "run_vina_array.lsf"
+    out.write_text(txt)
+    return out
+
 def write_submitter(paths: list[Path]) -> Path:
     sh = HERE / "submit_all_vina.sh"
-    lines = [
-        "#!/bin/bash",
-        "set -euo pipefail",
-        f'echo "Submitting {len(paths)} docking jobs..."'
-    ]
-    for p in paths:
-        lines.append(f'bsub < "{p.name}"')
-    sh.write_text("\n".join(lines) + "\n")
+    # stream through the buffered file instead of joining one big string
+    with open(sh, "w", newline="\n") as fh:
+        fh.write(f'#!/bin/bash\nset -euo pipefail\necho "Submitting {len(paths)} docking jobs..."\n')
+        fh.writelines(f'bsub < "{p.name}"\n' for p in paths)
     os.chmod(sh, 0o755)
     return sh
 
@@ -180,8 +242,9 @@ def write_submitter(paths: list[Path]) -> Path:
 def main():
     print("\n=== Vina Job Builder (Fast Mode) ===")
 
-    lig_candidates = ligand_dirs_only()
-    rec_candidates = receptor_dirs_only()
+    workspace_dirs = scan_workspace()
+    lig_candidates = ligand_dirs_only(workspace_dirs)
+    rec_candidates = receptor_dirs_only(workspace_dirs)
     csv_candidates = list_files("*.csv")
 
     if not lig_candidates:
@@ -196,6 +259,8 @@ def main():
         print("❌ No CSV files found in current working directory.")
         sys.exit(2)
 
+    csv_menu = "\n".join(f" [{i}] {p.name}" for i, p in enumerate(csv_candidates, start=1))
+
     # Ask ligand scope
     lig_scope = input(
         "\nLigands scope?\n"
@@ -207,11 +272,11 @@ def main():
     if lig_scope == "1":
         show_indexed(lig_candidates, "Choose ONE Ligand Directory:")
         s = input("Enter index: ").strip()
-        idxs = parse_index_list(s, len(lig_candidates))
-        if len(idxs) != 1:
+        idx = parse_single_index(s, len(lig_candidates))
+        if idx is None:
             print("❌ Please select exactly one ligand directory.")
             sys.exit(2)
-        lig_dirs = [lig_candidates[idxs[0]]]
+        lig_dirs = [lig_candidates[idx]]
     elif lig_scope == "2":
         show_indexed(lig_candidates, "Choose MULTIPLE Ligand Directories:")
         s = input("Enter comma-separated indices (ranges ok, e.g. 1,3,5-7): ").strip()
@@ -233,6 +298,7 @@ def main():
     ).strip()
 
     poses = int(input_default("\nDocking poses per ligand", 9))
+    use_array = input_default("Submit as one LSF job array? (y/n)", "y").lower().startswith("y")
 
     # Defaults for LSF
     queue = DEFAULT_PROFILE.queue
@@ -242,48 +308,36 @@ def main():
     mem_per_core = DEFAULT_PROFILE.mem_per_core_mb
     email = DEFAULT_PROFILE.email
 
-    out_paths = []
+    jobs: List[Tuple[str, str, str, str]] = []
+    # tag each ligand directory once, not once per receptor directory
+    lig_tags = [(lig_dir.name, ligand_tag(lig_dir.name)) for lig_dir in lig_dirs]
+    template = build_lsf_template(queue, project, walltime, workers, mem_per_core, email)
 
     if mode == "1":
         show_indexed(rec_candidates, "Select the Receptors Directory:")
         s = input("Enter index: ").strip()
-        idxs = parse_index_list(s, len(rec_candidates))
-        if len(idxs) != 1:
+        idx = parse_single_index(s, len(rec_candidates))
+        if idx is None:
             print("❌ Select exactly one receptor directory.")
             sys.exit(2)
 
-        receptors_dir = rec_candidates[idxs[0]]
+        receptors_dir = rec_candidates[idx]
 
         print("\nCenters CSV options:")
-        for i, p in enumerate(csv_candidates, start=1):
-            print(f" [{i}] {p.name}")
+        print(csv_menu)
         s = input("Enter index of centers CSV for this receptors directory: ").strip()
-        idxs = parse_index_list(s, len(csv_candidates))
-        if len(idxs) != 1:
+        idx = parse_single_index(s, len(csv_candidates))
+        if idx is None:
             print("❌ Select exactly one centers CSV.")
             sys.exit(2)
 
-        centers_csv = csv_candidates[idxs[0]].name
+        centers_csv = csv_candidates[idx].name
         rec_tag = receptor_tag(receptors_dir.name)
 
-        for lig_dir in lig_dirs:
-            lt = ligand_tag(lig_dir.name)
-            jobtag = f"{rec_tag}_{lt}"
-            p = write_lsf(
-                jobtag=jobtag,
-                receptors=receptors_dir.name,
-                ligands=lig_dir.name,
-                centers_csv=centers_csv,
-                poses=poses,
-                queue=queue,
-                project=project,
-                walltime=walltime,
-                workers=workers,
-                mem_per_core=mem_per_core,
-                email=email
-            )
-            out_paths.append(p)
-            print(f"✅ Wrote {p.name}")
+        jobs.extend(
+            (f"{rec_tag}_{lt}", receptors_dir.name, lig_name, centers_csv)
+            for lig_name, lt in lig_tags
+        )
 
     elif mode == "2":
         show_indexed(rec_candidates, "Select Receptor Directories:")
@@ -295,44 +349,63 @@ def main():
 
         chosen_recs = [rec_candidates[i] for i in idxs]
 
+        same_csv = len(chosen_recs) > 1 and input(
+            "\nUse the same centers CSV for all receptors? [y/N]: "
+        ).strip().lower().startswith("y")
+
         rec_to_cent = {}
         for rd in chosen_recs:
-            print(f"\nCenters CSV for receptor directory: {rd.name}")
-            for i, p in enumerate(csv_candidates, start=1):
-                print(f" [{i}] {p.name}")
+            if same_csv:
+                print("\nCenters CSV for all receptor directories:")
+            else:
+                print(f"\nCenters CSV for receptor directory: {rd.name}")
+            print(csv_menu)
             s = input("Enter index: ").strip()
-            sel = parse_index_list(s, len(csv_candidates))
-            if len(sel) != 1:
+            sel = parse_single_index(s, len(csv_candidates))
+            if sel is None:
                 print("❌ Select exactly one centers CSV.")
                 sys.exit(2)
-            rec_to_cent[rd] = csv_candidates[sel[0]].name
+            if same_csv:
+                rec_to_cent = dict.fromkeys(chosen_recs, csv_candidates[sel].name)
+                break
+            rec_to_cent[rd] = csv_candidates[sel].name
 
         for rd in chosen_recs:
             rec_tag = receptor_tag(rd.name)
             centers_csv = rec_to_cent[rd]
 
-            for lig_dir in lig_dirs:
-                lt = ligand_tag(lig_dir.name)
-                jobtag = f"{rec_tag}_{lt}"
-                p = write_lsf(
-                    jobtag=jobtag,
-                    receptors=rd.name,
-                    ligands=lig_dir.name,
-                    centers_csv=centers_csv,
-                    poses=poses,
-                    queue=queue,
-                    project=project,
-                    walltime=walltime,
-                    workers=workers,
-                    mem_per_core=mem_per_core,
-                    email=email
-                )
-                out_paths.append(p)
-                print(f"✅ Wrote {p.name}")
+            jobs.extend(
+                (f"{rec_tag}_{lt}", rd.name, lig_name, centers_csv)
+                for lig_name, lt in lig_tags
+            )
     else:
         print("❌ Invalid choice for receptor mode.")
         sys.exit(2)
 
+    if use_array:
+        p = write_array_lsf(jobs, poses, template)
+        out_paths = [p]
+        print(f"✅ Wrote {p.name} (job array of {len(jobs)} docking jobs, table: vina_jobs.tsv)")
+    else:
+        out_paths = []
+        for jobtag, receptors, ligands, centers_csv in jobs:
+            p = write_lsf(
+                jobtag=jobtag,
+                receptors=receptors,
+                ligands=ligands,
+                centers_csv=centers_csv,
+                poses=poses,
+                queue=queue,
+                project=project,
+                walltime=walltime,
+                workers=workers,
+                mem_per_core=mem_per_core,
+                email=email,
+                template=template,
+            )
+            out_paths.append(p)
+            print(f"✅ Wrote {p.name}")
+
     sub = write_submitter(out_paths)
     print(f"\n✅ Master submitter: {sub.name}")
     print("Submit all with:\n  ./submit_all_vina.sh\n")
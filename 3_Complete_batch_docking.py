@@ -4,15 +4,18 @@ from __future__ import annotations
 import os
 import sys
 import csv
-import glob
 import subprocess
 import shutil
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
 import time
+import pickle
 import platform
 from datetime import datetime
 import argparse
+import multiprocessing
 import re
+from itertools import groupby, islice
+from operator import attrgetter
 from pathlib import Path
 
 from ligand_manifest import find_ligand_state_manifests, load_ligand_state_manifest, merge_ligand_metadata
@@ -27,6 +30,11 @@ def choose(prompt, items):
     idx = int(input("Enter index: "))
     return items[idx]
 
+PROGRESS_MIN_INTERVAL_S = 0.1
+RUN_LOG_FLUSH_EVERY = 128
+RUN_LOG_FLUSH_S = 2.0
+JOB_MANIFEST_VERSION = 1
+
 def progress_bar(done, total, width=40, successes=0, failures=0):
     """Render a single-line progress bar with percentage and counts."""
     if total == 0:
@@ -127,47 +135,78 @@ def _resolve_receptor_file(pdbid: str, receptor_files: list[str]) -> tuple[str |
     return None, "missing" if not fuzzy_matches else "ambiguous"
 
 # ---------- Docking worker ----------
+class DockingJob:
+    """One (receptor, ligand) Vina run; slotted, and pickled as a bare tuple for the pool."""
+    __slots__ = (
+        "ligand", "ligand_file", "receptor_file", "output_pdbqt", "output_log",
+        "cx", "cy", "cz", "pdbid", "num_modes", "vina_exe", "ligand_metadata",
+    )
+
+    def __init__(self, ligand, ligand_file, receptor_file, output_pdbqt, output_log,
+                 cx, cy, cz, pdbid, num_modes, vina_exe, ligand_metadata):
+        self.ligand = ligand
+        self.ligand_file = ligand_file
+        self.receptor_file = receptor_file
+        self.output_pdbqt = output_pdbqt
+        self.output_log = output_log
+        self.cx = cx
+        self.cy = cy
+        self.cz = cz
+        self.pdbid = pdbid
+        self.num_modes = num_modes
+        self.vina_exe = vina_exe
+        self.ligand_metadata = ligand_metadata
+
+    def __getitem__(self, key):
+        # job["output_pdbqt"] keeps working for callers written against the old dicts
+        return getattr(self, key)
+
+    def __reduce__(self):
+        return (DockingJob, tuple(getattr(self, name) for name in self.__slots__))
+
 def run_docking(job):
-    vina_exe = job["vina_exe"]
-
-    # Write Vina config
-    with open(job["config_path"], "w") as cfg:
-        cfg.write(f"receptor = {job['receptor_file']}\n")
-        cfg.write(f"ligand = {job['ligand_file']}\n")
-        cfg.write(f"center_x = {job['cx']}\n")
-        cfg.write(f"center_y = {job['cy']}\n")
-        cfg.write(f"center_z = {job['cz']}\n")
-        cfg.write(f"size_x = 20\n")
-        cfg.write(f"size_y = 20\n")
-        cfg.write(f"size_z = 20\n")
-        cfg.write(f"num_modes = {job['num_modes']}\n")
-        cfg.write(f"out = {job['output_pdbqt']}\n")
+    # Pass the box on the command line: no per-job config.txt on the shared filesystem
+    argv = [
+        job.vina_exe,
+        "--receptor", job.receptor_file,
+        "--ligand", job.ligand_file,
+        "--center_x", str(job.cx),
+        "--center_y", str(job.cy),
+        "--center_z", str(job.cz),
+        "--size_x", "20",
+        "--size_y", "20",
+        "--size_z", "20",
+        "--num_modes", str(job.num_modes),
+        "--out", job.output_pdbqt,
+        "--cpu", "1",
+    ]
 
     # Keep each Vina process to 1 thread; pool controls total concurrency
     env = os.environ.copy()
     env["OMP_NUM_THREADS"] = "1"
 
-    result = subprocess.run(
-        [vina_exe, "--config", job["config_path"], "--cpu", "1"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        env=env
-    )
-
-    # Save whichever stream has content
-    with open(job["output_log"], "wb") as log_file:
-        if result.stdout:
-            log_file.write(result.stdout)
+    # Vina's stdout (the bulk of the log) goes straight to log.txt through the
+    # file descriptor; only stderr, normally empty, passes through Python.
+    with open(job.output_log, "wb") as log_file:
+        # close_fds=False (fds are non-inheritable by default anyway) plus an
+        # absolute vina path lets CPython take its posix_spawn/vfork fast path
+        result = subprocess.run(
+            argv,
+            stdout=log_file,
+            stderr=subprocess.PIPE,
+            env=env,
+            close_fds=False,
+        )
         if result.stderr:
-            if result.stdout:
+            if log_file.tell():
                 log_file.write(b"\n--- STDERR ---\n")
             log_file.write(result.stderr)
 
     if result.returncode == 0:
-        return True, f"✅ {job['ligand']} → {job['pdbid']}"
+        return True, f"✅ {job.ligand} → {job.pdbid}"
     else:
         err = result.stderr.decode(errors='ignore').strip()
-        return False, f"❌ {job['ligand']} vs {job['pdbid']}: {err}"
+        return False, f"❌ {job.ligand} vs {job.pdbid}: {err}"
 
 
 def resolve_vina_executable(cli_vina_exe: str | None = None) -> str:
@@ -220,57 +259,188 @@ def resolve_vina_executable(cli_vina_exe: str | None = None) -> str:
     )
 
 
-def build_jobs(results_dir, ligand_dir, receptor_dir, grid_rows, num_modes, vina_exe):
-    jobs = []
-    ligand_files = glob.glob(os.path.join(ligand_dir, "*.pdbqt"))
-    receptor_files = []
-    for suffix in RECEPTOR_SUFFIXES:
-        receptor_files.extend(glob.glob(os.path.join(receptor_dir, f"*{suffix}")))
-    ligand_names = [os.path.splitext(os.path.basename(f))[0] for f in ligand_files]
+def worker_mp_context():
+    """
+    forkserver where the platform has it: workers start from a small server
+    process instead of forking the parent after it has loaded the manifests
+    and matched rows. Elsewhere keep the platform default.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return None
+
+
+def list_files_with_suffix(folder, suffixes) -> list[str]:
+    """One scandir of folder: paths of regular files ending in any of suffixes (like glob, dotfiles skipped)."""
+    suffixes = tuple(suffixes)
+    with os.scandir(folder) as it:
+        return sorted(
+            e.path for e in it
+            if e.name.endswith(suffixes) and not e.name.startswith(".") and e.is_file()
+        )
+
+def list_receptor_files(receptor_dir) -> list[str]:
+    return list_files_with_suffix(receptor_dir, RECEPTOR_SUFFIXES)
+
+def load_docking_inputs(ligand_dir, receptor_dir):
+    """Scan both folders once and load the ligand manifests: (ligands, receptor_files, manifest_map)."""
+    # the scan already proved every ligand exists: no per-pair os.path.exists;
+    # names come straight from the DirEntry, sliced rather than splitext'ed
+    with os.scandir(ligand_dir) as it:
+        ligands = sorted(
+            (e.name[:-6], e.path) for e in it
+            if e.name.endswith(".pdbqt") and not e.name.startswith(".") and e.is_file()
+        )
+    receptor_files = list_receptor_files(receptor_dir)
     manifest_map = {}
     for manifest_path in find_ligand_state_manifests([Path(ligand_dir), Path(ligand_dir).parent]):
         manifest_map.update(load_ligand_state_manifest(manifest_path))
 
-    if not ligand_names:
+    if not ligands:
         raise FileNotFoundError(f"No ligands (*.pdbqt) found in {ligand_dir}")
     if not receptor_files:
         raise FileNotFoundError(f"No receptors (*{', *'.join(RECEPTOR_SUFFIXES)}) found in {receptor_dir}")
+    return ligands, receptor_files, manifest_map
 
+def match_center_rows(grid_rows, receptor_files, unmatched=None):
+    """Yield (row, receptor_file) for each center row; unresolved (PDB_ID, match_kind) go to unmatched."""
     for row in grid_rows:
+        receptor_file, match_kind = _resolve_receptor_file(row["PDB_ID"], receptor_files)
+        if receptor_file:
+            yield row, receptor_file
+        elif unmatched is not None:
+            unmatched.append((row["PDB_ID"], match_kind))
+
+def _center_key(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value).strip()
+
+def unique_center_rows(matched_rows, duplicates=None):
+    """
+    Drop repeated (receptor_file, X, Y, Z) centers, e.g. one pocket listed
+    under several receptor aliases: every ligand would be docked again into
+    the same output folder. Dropped PDB_IDs go to duplicates.
+    """
+    seen = set()
+    for row, receptor_file in matched_rows:
+        key = (receptor_file, _center_key(row["X"]), _center_key(row["Y"]), _center_key(row["Z"]))
+        if key in seen:
+            if duplicates is not None:
+                duplicates.append(row["PDB_ID"])
+            continue
+        seen.add(key)
+        yield row, receptor_file
+
+def _safe_pdbid(receptor_file):
+    safe_pdbid = os.path.basename(receptor_file)
+    return safe_pdbid.replace(".pdbqt", "").replace(".pdb", "").replace(".mol2", "")
+
+def completed_outputs(results_dir):
+    """
+    {(receptor_subdir, ligand)} under results_dir whose out.pdbqt exists and
+    is non-empty; one scandir per receptor folder plus a stat per pair folder.
+    """
+    done = set()
+    try:
+        top = os.scandir(results_dir)
+    except FileNotFoundError:
+        return done
+    with top:
+        for rec in top:
+            if not rec.is_dir():
+                continue
+            with os.scandir(rec.path) as it:
+                for lig in it:
+                    if not lig.is_dir():
+                        continue
+                    try:
+                        if os.stat(f"{lig.path}{os.sep}out.pdbqt").st_size > 0:
+                            done.add((rec.name, lig.name))
+                    except OSError:
+                        pass
+    return done
+
+def iter_jobs(results_dir, ligands, matched_rows, num_modes, vina_exe, manifest_map, done=frozenset()):
+    """
+    Yield one DockingJob per (center row, ligand), lazily, skipping pairs in
+    done (see completed_outputs). Each receptor's output tree is created in
+    one pass (makedirs for the receptor, a bare mkdir per ligand) just before
+    its first job is yielded.
+    """
+    # Per-ligand invariants, computed once instead of once per receptor row
+    ligand_meta = [
+        (ligand, ligand_file, merge_ligand_metadata(ligand, manifest_row=manifest_map.get(ligand)))
+        for ligand, ligand_file in ligands
+    ]
+    sep = os.sep
+    made = set()
+    for row, receptor_file in matched_rows:
         pdbid = row["PDB_ID"]
         cx, cy, cz = row["X"], row["Y"], row["Z"]
-        receptor_file, _ = _resolve_receptor_file(pdbid, receptor_files)
-        if not receptor_file:
-            continue
 
-        for ligand in ligand_names:
-            ligand_file = os.path.join(ligand_dir, f"{ligand}.pdbqt")
-            if not os.path.exists(ligand_file):
+        safe_pdbid = _safe_pdbid(receptor_file)
+        receptor_out = f"{results_dir}{sep}{safe_pdbid}"
+        if receptor_out not in made:
+            made.add(receptor_out)
+            os.makedirs(receptor_out, exist_ok=True)
+            for ligand, _ in ligands:
+                try:
+                    os.mkdir(os.path.join(receptor_out, ligand))
+                except FileExistsError:
+                    pass
+
+        for ligand, ligand_file, metadata in ligand_meta:
+            if done and (safe_pdbid, ligand) in done:
                 continue
-
-            safe_pdbid = os.path.basename(receptor_file)
-            safe_pdbid = safe_pdbid.replace(".pdbqt", "").replace(".pdb", "").replace(".mol2", "")
-            output_subdir = os.path.join(results_dir, safe_pdbid, ligand)
-            os.makedirs(output_subdir, exist_ok=True)
-
-            jobs.append(
-                {
-                    "ligand": ligand,
-                    "ligand_file": ligand_file,
-                    "receptor_file": receptor_file,
-                    "output_pdbqt": os.path.join(output_subdir, "out.pdbqt"),
-                    "output_log": os.path.join(output_subdir, "log.txt"),
-                    "config_path": os.path.join(output_subdir, "config.txt"),
-                    "cx": cx,
-                    "cy": cy,
-                    "cz": cz,
-                    "pdbid": pdbid,
-                    "num_modes": num_modes,
-                    "vina_exe": vina_exe,
-                    "ligand_metadata": merge_ligand_metadata(ligand, manifest_row=manifest_map.get(ligand)),
-                }
+            output_subdir = f"{receptor_out}{sep}{ligand}"
+            yield DockingJob(
+                ligand=ligand,
+                ligand_file=ligand_file,
+                receptor_file=receptor_file,
+                output_pdbqt=f"{output_subdir}{sep}out.pdbqt",
+                output_log=f"{output_subdir}{sep}log.txt",
+                cx=cx,
+                cy=cy,
+                cz=cz,
+                pdbid=pdbid,
+                num_modes=num_modes,
+                vina_exe=vina_exe,
+                ligand_metadata=metadata,
             )
-    return jobs
+
+def build_jobs(results_dir, ligand_dir, receptor_dir, grid_rows, num_modes, vina_exe):
+    ligands, receptor_files, manifest_map = load_docking_inputs(ligand_dir, receptor_dir)
+    matched = unique_center_rows(match_center_rows(grid_rows, receptor_files))
+    return list(iter_jobs(results_dir, ligands, matched, num_modes, vina_exe, manifest_map))
+
+def _dock_chunk(chunk):
+    return [run_docking(job) for job in chunk]
+
+def receptor_chunks(jobs, chunksize):
+    """
+    Lists of up to chunksize consecutive jobs that never span two receptors,
+    so each worker docks one receptor file (page-cache warm) per chunk.
+    """
+    for _, same_receptor in groupby(jobs, key=attrgetter("receptor_file")):
+        yield from iter(lambda: list(islice(same_receptor, chunksize)), [])
+
+def iter_docking_results(executor, jobs, chunksize, max_in_flight):
+    """
+    Submit jobs in chunks of chunksize with at most max_in_flight chunks
+    queued, pulling from jobs only as slots free up; yield (ok, line) per job
+    as chunks finish.
+    """
+    pending = set()
+    for chunk in receptor_chunks(jobs, chunksize):
+        pending.add(executor.submit(_dock_chunk, chunk))
+        if len(pending) >= max_in_flight:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield from fut.result()
+    for fut in as_completed(pending):
+        yield from fut.result()
 
 def cpu_count_cgroup_aware():
     """Respect cgroup/LSF limits; fall back to os.cpu_count()."""
@@ -287,29 +457,19 @@ def cpu_count_cgroup_aware():
             pass
     return max(1, n)
 
-def parse_args():
-    ap = argparse.ArgumentParser(
-        description="Batch AutoDock Vina runner (scheduler-friendly). "
-                    "Provide flags for non-interactive use; falls back to interactive otherwise."
-    )
-    ap.add_argument("--receptors", help="Path to receptor folder")
-    ap.add_argument("--ligands", help="Path to ligand folder with .pdbqt ligands")
-    ap.add_argument("--centers_csv", help="Path to vina centers CSV with headers PDB_ID,X,Y,Z")
-    ap.add_argument("--poses", type=int, help="num_modes per ligand (e.g., 9, 20, 64)")
-    ap.add_argument("--vina-exe", help="Path to AutoDock Vina executable")
-    ap.add_argument("--reserve_cores", type=int, default=1,
-                    help="How many cores to reserve for system/IO (default: 1)")
-    return ap.parse_args()
-
-# ---------- Main ----------
-def main():
-    args = parse_args()
-    start_time = time.time()
-    start_stamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    timestamp_tag = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    cwd = os.getcwd()
-    vina_exe = resolve_vina_executable(args.vina_exe)
-
+def docking_chunksize(total_jobs, max_workers, cap=16):
+    """
+    Jobs handed to a worker per dispatch: about four chunks per worker, but
+    capped, since Vina runtimes vary a lot and big chunks stall the tail.
+    """
+    return max(1, min(cap, total_jobs // (max_workers * 4)))
+
+def prepare_jobs(args, cwd, timestamp_tag, vina_exe):
+    """
+    Resolve inputs, match centers to receptors and set up the results folder.
+    Returns the run plan (inputs, tags, log messages, total_jobs and a lazy
+    jobs iterator), or None when a resumed folder has nothing left to dock.
+    """
     # Resolve inputs (flags preferred; else interactive)
     if args.receptors and args.ligands and args.centers_csv and args.poses:
         receptor_dir = os.path.abspath(args.receptors)
@@ -328,43 +488,171 @@ def main():
         ligand_dir   = os.path.join(cwd, ligand_dir)
         vina_csv     = os.path.join(cwd, vina_csv)
 
+    ligands, receptor_files, manifest_map = load_docking_inputs(ligand_dir, receptor_dir)
+
     # --- Read grid centers FIRST (so we can validate before building names/dirs) ---
+    # The header is checked before any row is read; rows stream straight into
+    # receptor matching, and only matched centers (one per receptor) are kept.
+    unmatched = []
+    duplicate_centers = []
     with open(vina_csv, "r", newline="") as f:
         reader = csv.DictReader(f)
-        grid_rows = list(reader)
-
-    required_cols = {"PDB_ID", "X", "Y", "Z"}
-    if not required_cols.issubset(set(reader.fieldnames or [])):
-        raise ValueError(f"CSV {vina_csv} must have headers: {sorted(required_cols)}")
+        required_cols = {"PDB_ID", "X", "Y", "Z"}
+        if not required_cols.issubset(set(reader.fieldnames or [])):
+            raise ValueError(f"CSV {vina_csv} must have headers: {sorted(required_cols)}")
+        matched_rows = list(unique_center_rows(match_center_rows(reader, receptor_files, unmatched), duplicate_centers))
+    # Group rows that share a receptor file so its jobs are dispatched back to back
+    matched_rows.sort(key=lambda pair: pair[1])
 
     # --- Build naming tags from folder names only (no centers tag) ---
     rec_tag = _receptor_tag_from_dir(receptor_dir)
     lig_tag = _ligand_tag_from_dir(ligand_dir)
 
     # --- Outputs with receptor/ligand/poses/timestamp ---
-    results_dir = os.path.join(
-        cwd, f"Docking_Results_{rec_tag}_{lig_tag}_{num_modes}Poses_{timestamp_tag}"
-    )
+    if args.resume:
+        results_dir = os.path.abspath(args.resume)
+        if not os.path.isdir(results_dir):
+            raise SystemExit(f"❌ --resume folder not found: {results_dir}")
+    else:
+        results_dir = os.path.join(
+            cwd, f"Docking_Results_{rec_tag}_{lig_tag}_{num_modes}Poses_{timestamp_tag}"
+        )
     os.makedirs(results_dir, exist_ok=True)
 
+    # Pairs already docked in a resumed folder are not re-run (unless --force)
+    done = completed_outputs(results_dir) if (args.resume and not args.force) else set()
+
+    missing_receptor_msgs = [
+        f"❌ Unmatched receptor center: {pdbid} (match={match_kind})"
+        for pdbid, match_kind in unmatched
+    ]
+    messages = missing_receptor_msgs + [
+        f"⏭️ Duplicate receptor center skipped: {pdbid}" for pdbid in duplicate_centers
+    ]
+
+    total_jobs = len(matched_rows) * len(ligands)
+    skipped = 0
+    if done:
+        ligand_names = {ligand for ligand, _ in ligands}
+        done_per_receptor = {}
+        for rec, lig in done:
+            if lig in ligand_names:
+                done_per_receptor[rec] = done_per_receptor.get(rec, 0) + 1
+        skipped = sum(done_per_receptor.get(_safe_pdbid(rf), 0) for _, rf in matched_rows)
+        total_jobs -= skipped
+        print(f"⏭️  Resuming: skipping {skipped} pair(s) that already have out.pdbqt", flush=True)
+
+    if total_jobs == 0 and skipped:
+        print(f"✅ Nothing left to dock in {results_dir}", flush=True)
+        return None
+
+    if total_jobs == 0:
+        available = ", ".join(sorted(os.path.basename(path) for path in receptor_files)[:10]) or "(none found)"
+        details = "; ".join(missing_receptor_msgs[:5]) if missing_receptor_msgs else "no receptor-center rows matched"
+        raise RuntimeError(
+            "No jobs prepared. Check receptors/ligands/CSV inputs. "
+            f"Available receptors: {available}. Details: {details}"
+        )
+
+    # Jobs are generated lazily, so the R x L jobs never all sit in memory at once
+    return {
+        "receptor_dir": receptor_dir,
+        "ligand_dir": ligand_dir,
+        "centers_csv": vina_csv,
+        "num_modes": num_modes,
+        "results_dir": results_dir,
+        "rec_tag": rec_tag,
+        "lig_tag": lig_tag,
+        "messages": messages,
+        "total_jobs": total_jobs,
+        "jobs": iter_jobs(results_dir, ligands, matched_rows, num_modes, vina_exe, manifest_map, done),
+    }
+
+def write_job_manifest(path, plan):
+    """Pickle a prepared plan for --execute-from; jobs are stored as plain field tuples."""
+    data = dict(plan, version=JOB_MANIFEST_VERSION)
+    data["jobs"] = [tuple(getattr(job, name) for name in DockingJob.__slots__) for job in plan["jobs"]]
+    with open(path, "wb") as fh:
+        pickle.dump(data, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+def read_job_manifest(path):
+    with open(path, "rb") as fh:
+        data = pickle.load(fh)
+    if not isinstance(data, dict) or data.get("version") != JOB_MANIFEST_VERSION:
+        raise SystemExit(f"❌ Not a job manifest written by --prepare-only: {path}")
+    data["jobs"] = [DockingJob(*fields) for fields in data["jobs"]]
+    return data
+
+def parse_args():
+    ap = argparse.ArgumentParser(
+        description="Batch AutoDock Vina runner (scheduler-friendly). "
+                    "Provide flags for non-interactive use; falls back to interactive otherwise."
+    )
+    ap.add_argument("--receptors", help="Path to receptor folder")
+    ap.add_argument("--ligands", help="Path to ligand folder with .pdbqt ligands")
+    ap.add_argument("--centers_csv", help="Path to vina centers CSV with headers PDB_ID,X,Y,Z")
+    ap.add_argument("--poses", type=int, help="num_modes per ligand (e.g., 9, 20, 64)")
+    ap.add_argument("--vina-exe", help="Path to AutoDock Vina executable")
+    ap.add_argument("--reserve_cores", type=int, default=1,
+                    help="How many cores to reserve for system/IO (default: 1)")
+    ap.add_argument("--resume", metavar="RESULTS_DIR",
+                    help="Write into an existing Docking_Results_* folder and skip pairs whose out.pdbqt "
+                         "is already non-empty (re-run an interrupted batch)")
+    ap.add_argument("--force", action="store_true",
+                    help="With --resume, re-dock every pair even if its output exists")
+    ap.add_argument("--prepare-only", metavar="MANIFEST",
+                    help="Match inputs, create the results tree and write the job list to MANIFEST "
+                         "without running Vina")
+    ap.add_argument("--execute-from", metavar="MANIFEST",
+                    help="Run the jobs in a MANIFEST written by --prepare-only (no input scanning)")
+    return ap.parse_args()
+
+# ---------- Main ----------
+def main():
+    args = parse_args()
+    start_time = time.time()
+    start_stamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    timestamp_tag = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    cwd = os.getcwd()
+
+    if args.execute_from:
+        if args.prepare_only or args.resume:
+            raise SystemExit("❌ --execute-from cannot be combined with --prepare-only or --resume")
+        plan = read_job_manifest(args.execute_from)
+        # Vina is resolved where the jobs run, not where they were prepared
+        vina_exe = resolve_vina_executable(args.vina_exe)
+        for job in plan["jobs"]:
+            job.vina_exe = vina_exe
+        plan["total_jobs"] = len(plan["jobs"])
+        print(f"📦 Loaded {plan['total_jobs']} job(s) from {os.path.abspath(args.execute_from)}", flush=True)
+    else:
+        vina_exe = (args.vina_exe or "vina") if args.prepare_only else resolve_vina_executable(args.vina_exe)
+        plan = prepare_jobs(args, cwd, timestamp_tag, vina_exe)
+        if plan is None:
+            return
+        if args.prepare_only:
+            plan["jobs"] = list(plan["jobs"])
+            write_job_manifest(args.prepare_only, plan)
+            print(f"📦 Wrote {len(plan['jobs'])} job(s) to {os.path.abspath(args.prepare_only)}", flush=True)
+            print(f"   Run them with --execute-from {os.path.abspath(args.prepare_only)}", flush=True)
+            return
+
+    receptor_dir = plan["receptor_dir"]
+    ligand_dir   = plan["ligand_dir"]
+    vina_csv     = plan["centers_csv"]
+    num_modes    = plan["num_modes"]
+    results_dir  = plan["results_dir"]
+    rec_tag      = plan["rec_tag"]
+    lig_tag      = plan["lig_tag"]
+    total_jobs   = plan["total_jobs"]
+    jobs         = plan["jobs"]
+
     # Run log (append all results; keeps terminal quiet) — tagged
     run_log_path = os.path.join(
         cwd, f"run_log_{rec_tag}_{lig_tag}_{num_modes}Poses_{timestamp_tag}.txt"
     )
-    run_log = open(run_log_path, "a", encoding="utf-8")
-
-    jobs = build_jobs(results_dir, ligand_dir, receptor_dir, grid_rows, num_modes, vina_exe)
-    receptor_files = []
-    for suffix in RECEPTOR_SUFFIXES:
-        receptor_files.extend(glob.glob(os.path.join(receptor_dir, f"*{suffix}")))
-    missing_receptor_msgs = []
-    for row in grid_rows:
-        receptor_file, match_kind = _resolve_receptor_file(row["PDB_ID"], receptor_files)
-        if not receptor_file:
-            missing_receptor_msgs.append(
-                f"❌ Unmatched receptor center: {row['PDB_ID']} (match={match_kind})"
-            )
-    for msg in missing_receptor_msgs:
+    run_log = open(run_log_path, "a", encoding="utf-8", buffering=1 << 16)
+    for msg in plan["messages"]:
         run_log.write(msg + "\n")
     run_log.flush()
 
@@ -379,28 +667,19 @@ def main():
 
     successes, failures = 0, 0
     results_log = []
-    total_jobs = len(jobs)
-
-    if total_jobs == 0:
-        available = ", ".join(sorted(os.path.basename(path) for path in receptor_files)[:10]) or "(none found)"
-        details = "; ".join(missing_receptor_msgs[:5]) if missing_receptor_msgs else "no receptor-center rows matched"
-        raise RuntimeError(
-            "No jobs prepared. Check receptors/ligands/CSV inputs. "
-            f"Available receptors: {available}. Details: {details}"
-        )
 
     # Initial progress bar line
     progress_bar(0, total_jobs, successes=0, failures=0)
 
     # Concurrency limited by max_workers; quiet terminal, log to file
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(run_docking, job) for job in jobs]
+    # Jobs are dispatched in chunks (one IPC round-trip per chunk)
+    chunksize = docking_chunksize(total_jobs, max_workers)
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=worker_mp_context()) as executor:
         done_count = 0
-        for future in as_completed(futures):
-            ok, line = future.result()
+        last_draw = last_flush = time.monotonic()
+        for ok, line in iter_docking_results(executor, jobs, chunksize, 2 * max_workers):
             results_log.append(line)
             run_log.write(line + "\n")
-            run_log.flush()
 
             if ok:
                 successes += 1
@@ -408,7 +687,16 @@ def main():
                 failures += 1
 
             done_count += 1
-            progress_bar(done_count, total_jobs, successes=successes, failures=failures)
+            # Redraw at most ~10x per second; the final 100% line always draws
+            now = time.monotonic()
+            if done_count == total_jobs or now - last_draw >= PROGRESS_MIN_INTERVAL_S:
+                last_draw = now
+                progress_bar(done_count, total_jobs, successes=successes, failures=failures)
+            # The run log is buffered; flush every RUN_LOG_FLUSH_EVERY results or
+            # RUN_LOG_FLUSH_S seconds so `tail -f` still follows a live batch
+            if done_count % RUN_LOG_FLUSH_EVERY == 0 or now - last_flush >= RUN_LOG_FLUSH_S:
+                last_flush = now
+                run_log.flush()
 
     end_time = time.time()
     duration_min = round((end_time - start_time) / 60, 2)
@@ -421,41 +709,46 @@ def main():
         cwd, f"job_duration_{rec_tag}_{lig_tag}_{num_modes}Poses_{timestamp_tag}.txt"
     )
     with open(duration_txt, "w", encoding="utf-8") as df:
-        df.write(f"Start Time : {start_stamp}\n")
-        df.write(f"End Time   : {end_stamp}\n")
-        df.write(f"Duration   : {duration_min} minutes\n")
-        df.write(f"Duration_s : {duration_sec} seconds\n")
-        df.write(f"Jobs Total : {total_jobs}\n")
-        df.write(f"Successes  : {successes}\n")
-        df.write(f"Failures   : {failures}\n")
+        df.write(
+            f"Start Time : {start_stamp}\n"
+            f"End Time   : {end_stamp}\n"
+            f"Duration   : {duration_min} minutes\n"
+            f"Duration_s : {duration_sec} seconds\n"
+            f"Jobs Total : {total_jobs}\n"
+            f"Successes  : {successes}\n"
+            f"Failures   : {failures}\n"
+        )
 
     # Summary file (tagged)
     summary_path = os.path.join(
         cwd, f"docking_summary_{rec_tag}_{lig_tag}_{num_modes}Poses_{timestamp_tag}.txt"
     )
-    with open(summary_path, "w", encoding="utf-8") as f:
-        f.write("Docking Summary Report\n")
-        f.write("=======================\n")
-        f.write(f"Start Time : {start_stamp}\n")
-        f.write(f"End Time   : {end_stamp}\n")
-        f.write(f"Total Time : {duration_min} minutes\n")
-        f.write(f"Jobs Run   : {total_jobs}\n")
-        f.write(f"Successes  : {successes}\n")
-        f.write(f"Failures   : {failures}\n\n")
-        f.write("System Info:\n")
-        f.write(f" - Platform: {platform.system()} {platform.release()}\n")
-        f.write(f" - CPU Cores (schedulable): {ncpus}\n")
-        f.write(f" - Max Workers (cores used): {max_workers}\n")
-        f.write(f" - Threads per Vina job: 1 (via --cpu 1 / OMP_NUM_THREADS=1)\n\n")
-        f.write("Inputs/Outputs:\n")
-        f.write(f" - Receptor dir: {receptor_dir}\n")
-        f.write(f" - Ligand dir  : {ligand_dir}\n")
-        f.write(f" - Centers CSV : {vina_csv}\n")
-        f.write(f" - Results dir : {results_dir}\n")
-        f.write(f" - num_modes   : {num_modes}\n\n")
-        f.write("Results:\n--------\n")
-        for line in results_log:
-            f.write(line + "\n")
+    # One write for the header and one for the per-job lines
+    with open(summary_path, "w", encoding="utf-8", buffering=1 << 20) as f:
+        f.write(
+            "Docking Summary Report\n"
+            "=======================\n"
+            f"Start Time : {start_stamp}\n"
+            f"End Time   : {end_stamp}\n"
+            f"Total Time : {duration_min} minutes\n"
+            f"Jobs Run   : {total_jobs}\n"
+            f"Successes  : {successes}\n"
+            f"Failures   : {failures}\n\n"
+            "System Info:\n"
+            f" - Platform: {platform.system()} {platform.release()}\n"
+            f" - CPU Cores (schedulable): {ncpus}\n"
+            f" - Max Workers (cores used): {max_workers}\n"
+            f" - Threads per Vina job: 1 (via --cpu 1 / OMP_NUM_THREADS=1)\n\n"
+            "Inputs/Outputs:\n"
+            f" - Receptor dir: {receptor_dir}\n"
+            f" - Ligand dir  : {ligand_dir}\n"
+            f" - Centers CSV : {vina_csv}\n"
+            f" - Results dir : {results_dir}\n"
+            f" - num_modes   : {num_modes}\n\n"
+            "Results:\n--------\n"
+        )
+        if results_log:
+            f.write("\n".join(results_log) + "\n")
 
     print(f"\n⏱️  Duration file : {duration_txt}", flush=True)
     print(f"🧾 Run log       : {run_log_path}", flush=True)
@@ -232,6 +232,7 @@ def main():
     )
     ap.add_argument(
         "--no-sort",
+        dest="no_sort",
         action="store_true",
         help="Write unsorted CSV (faster, but not ranked globally)."
     )
@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
-import os, sys, re, csv, argparse, threading
+import os, sys, re, csv, argparse, mmap
+from array import array
+from collections import defaultdict
+from itertools import islice
+from operator import itemgetter
 from pathlib import Path
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from typing import Dict, List, Optional, Tuple
 
 from ligand_manifest import (
@@ -15,13 +19,24 @@ from ligand_manifest import (
 )
 from ligand_naming import parse_ligand_variant
 
+try:
+    import pandas as pd
+    HAVE_PANDAS = True
+except Exception:  # pragma: no cover - optional fast CSV writer
+    pd = None
+    HAVE_PANDAS = False
+
+# Below this many rows the stdlib csv writer is as fast as building a DataFrame
+PANDAS_CSV_MIN_ROWS = 100_000
+
 # ==========================================================
 # Command-line argument parser
 # ==========================================================
 def parse_cli():
     ap = argparse.ArgumentParser(description="4_ParseScores: parse Vina results for one or more Docking_Results_* dirs.")
     ap.add_argument("--dir", help="Single Docking_Results_* directory to process (non-interactive).")
-    ap.add_argument("--workers", type=int, default=8, help="Worker threads per job (default: 8).")
+    ap.add_argument("--workers", type=int, default=0,
+                    help="Worker processes per job (default: 0 = all schedulable cores).")
     ap.add_argument("--heartbeat", type=int, default=1000, help="Files per progress update.")
     ap.add_argument("--fallback-crawl", action="store_true", help="If log missing, crawl directory.")
     ap.add_argument("--keep-configs", action="store_true", help="Keep per-job config.txt files after successful parsing.")
@@ -30,26 +45,39 @@ def parse_cli():
 # ==========================================================
 # Regex patterns
 # ==========================================================
-VINA_RE = re.compile(r"^REMARK\s+VINA\s+RESULT:\s+(-?\d+(?:\.\d+)?)")
+MMAP_MIN_BYTES = 1 << 20
+# Run with finditer over a whole file: the literal "REMARK" prefix lets the
+# regex engine skip between candidates in C (a ^ anchor would defeat that)
+VINA_RE = re.compile(rb"REMARK[ \t]+VINA[ \t]+RESULT:[ \t]+(-?\d+(?:\.\d+)?)")
 OK_LINE = re.compile(r"^[\s✅\-\+]?\s*(.+?)\s*→\s*([A-Za-z0-9._-]+)\s*$")  # ligand  → receptor.pdbqt
+RECEPTOR_CHARS = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789._-")
 
 # ==========================================================
 # Helper functions
 # ==========================================================
+def _scan_vina(buf) -> List[Tuple[int, float]]:
+    """(pose_idx, affinity) for each VINA RESULT line in buf (bytes or mmap), in one finditer pass."""
+    poses = []
+    for m in VINA_RE.finditer(buf):
+        i = m.start()
+        # Only a REMARK at the start of a line counts
+        if i and buf[i - 1] not in b"\r\n":
+            continue
+        poses.append((len(poses) + 1, float(m.group(1))))
+    return poses
+
 def parse_vina_pdbqt(p: Path):
     """Parse a PDBQT file for all VINA RESULT lines."""
-    poses = []
     try:
-        with open(p, "r", errors="ignore") as fh:
-            pose_idx = 0
-            for line in fh:
-                m = VINA_RE.match(line)
-                if m:
-                    pose_idx += 1
-                    poses.append((pose_idx, float(m.group(1))))
+        with open(p, "rb", buffering=0) as fh:
+            # Typical out.pdbqt files (tens of KB) are cheaper to read() whole;
+            # large ones are scanned in place from the page cache
+            if os.fstat(fh.fileno()).st_size >= MMAP_MIN_BYTES:
+                with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return _scan_vina(mm)
+            return _scan_vina(fh.read())
     except Exception:
-        pass
-    return poses
+        return []
 
 def find_candidates() -> List[Path]:
     """Return all Docking_Results_* directories in the current folder."""
@@ -65,24 +93,57 @@ def match_run_log(results_dir: Path) -> Optional[Path]:
     cands = sorted(results_dir.parent.glob(f"run_log_{rest}*.txt"))
     return cands[0] if cands else None
 
+def split_ok_line(line: str) -> Optional[Tuple[str, str]]:
+    """
+    (ligand, receptor_file) from a "✅ ligand → receptor" log line, else None.
+    Same result as OK_LINE, using str ops; the regex only sees lines the
+    split cannot settle.
+    """
+    line = line.replace("->", "→").strip()
+    ligand, arrow, receptor_file = line.partition("→")
+    if not arrow:
+        return None
+    if ligand[:1] in "✅-+" or ligand[:1].isspace():
+        ligand = ligand[1:]
+    ligand = ligand.strip()
+    receptor_file = receptor_file.strip()
+    if ligand and receptor_file and RECEPTOR_CHARS.issuperset(receptor_file):
+        return ligand, receptor_file
+    m = OK_LINE.match(line)
+    return (m.group(1).strip(), m.group(2).strip()) if m else None
+
 def parse_log_to_targets(results_dir: Path, log_path: Path) -> List[Tuple[str, str, Path]]:
     """Extract receptor-ligand-outfile mappings from a run_log_*.txt."""
     ok_pairs = []
-    with open(log_path, "r", encoding="utf-8", errors="ignore") as lf:
+    with open(log_path, "r", encoding="utf-8", errors="ignore", buffering=1 << 20) as lf:
         for line in lf:
-            if "✅" not in line and "->" not in line and "→" not in line:
+            if "→" not in line and "->" not in line:
                 continue
-            line = line.replace("->", "→")
-            m = OK_LINE.match(line.strip())
-            if not m:
+            pair = split_ok_line(line)
+            if pair is None:
                 continue
-            ligand_dir = m.group(1).strip()
-            receptor_file = m.group(2).strip()
+            ligand_dir, receptor_file = pair
             receptor_dir = receptor_file.replace(".pdbqt", "").replace(".pdb", "").replace(".mol2", "")
             p = results_dir / receptor_dir / ligand_dir / "out.pdbqt"
             ok_pairs.append((receptor_dir, ligand_dir, p))
     return ok_pairs
 
+def find_outfiles(root: str, name: str):
+    """Yield str paths of files called name under root, skipping hidden dirs (scandir stack, no os.walk lists)."""
+    stack = [root]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False):
+                    if not e.name.startswith("."):
+                        stack.append(e.path)
+                elif e.name == name and e.is_file():
+                    yield e.path
+
 def choose_multi(items: List[Path]) -> List[Path]:
     """Interactive picker for Docking_Results_* directories."""
     print("\nSelect Docking_Results_* directories:")
@@ -149,33 +210,75 @@ def build_score_rows(
     poses: List[Tuple[int, float]],
     manifest_row: Optional[Dict[str, str]] = None,
 ) -> List[Dict[str, object]]:
+    base = score_row_base(receptor, ligand_variant, outfile_path, manifest_row)
+    return expand_score_rows(base, poses)
+
+
+def score_row_base(
+    receptor: str,
+    ligand_variant: str,
+    outfile_path: Path,
+    manifest_row: Optional[Dict[str, str]] = None,
+) -> Dict[str, object]:
+    """Every output column except Pose/Binding_Affinity: the same for all poses of one file."""
     parsed = parse_ligand_variant(ligand_variant)
     metadata = merge_ligand_metadata(ligand_variant, manifest_row=manifest_row)
+    base = {
+        "Receptor": receptor,
+        "Ligand": metadata["LigandBase"] or parsed["LigandBase"],
+        "LigandBase": metadata["LigandBase"] or parsed["LigandBase"],
+        "LigandVariant": metadata["LigandVariant"] or parsed["LigandVariant"],
+        "Pose": 0,
+        "Binding_Affinity": 0.0,
+        "OutFile": str(outfile_path.resolve()),
+        "ProtomerTag": metadata["ProtomerTag"],
+        "TautomerTag": metadata["TautomerTag"],
+        "ConformerTag": metadata["ConformerTag"],
+        "LegacyPoseTag": metadata["LegacyPoseTag"],
+        "StateTag": metadata["StateTag"],
+        "ProtomerIndex": metadata["ProtomerIndex"],
+        "TautomerIndex": metadata["TautomerIndex"],
+        "ConformerIndex": metadata["ConformerIndex"],
+    }
+    for key in CHEMICAL_METADATA_COLUMNS:
+        base[key] = metadata.get(key, "")
+    return base
+
+
+def expand_score_rows(base: Dict[str, object], poses) -> List[Dict[str, object]]:
+    """One row per (pose_idx, affinity), each a copy of base."""
     rows = []
     for pose_idx, aff in poses:
-        row = {
-            "Receptor": receptor,
-            "Ligand": metadata["LigandBase"] or parsed["LigandBase"],
-            "LigandBase": metadata["LigandBase"] or parsed["LigandBase"],
-            "LigandVariant": metadata["LigandVariant"] or parsed["LigandVariant"],
-            "Pose": pose_idx,
-            "Binding_Affinity": float(aff),
-            "OutFile": str(outfile_path.resolve()),
-            "ProtomerTag": metadata["ProtomerTag"],
-            "TautomerTag": metadata["TautomerTag"],
-            "ConformerTag": metadata["ConformerTag"],
-            "LegacyPoseTag": metadata["LegacyPoseTag"],
-            "StateTag": metadata["StateTag"],
-            "ProtomerIndex": metadata["ProtomerIndex"],
-            "TautomerIndex": metadata["TautomerIndex"],
-            "ConformerIndex": metadata["ConformerIndex"],
-        }
-        for key in CHEMICAL_METADATA_COLUMNS:
-            row[key] = metadata.get(key, "")
+        row = base.copy()
+        row["Pose"] = pose_idx
+        row["Binding_Affinity"] = float(aff)
         rows.append(row)
     return rows
 
 
+# Per-file values that repeat across many files (one receptor spans every ligand,
+# one ligand every receptor); bases unpickled from different batches would
+# otherwise each carry their own copy
+INTERNED_COLUMNS = (
+    "Receptor",
+    "Ligand",
+    "LigandBase",
+    "LigandVariant",
+    "ProtomerTag",
+    "TautomerTag",
+    "ConformerTag",
+    "StateTag",
+)
+
+
+def intern_shared_strings(row: Dict[str, object]) -> None:
+    """Replace the INTERNED_COLUMNS values of row with their interned str, in place."""
+    for key in INTERNED_COLUMNS:
+        value = row.get(key)
+        if isinstance(value, str):
+            row[key] = sys.intern(value)
+
+
 def delete_sibling_config(outfile_path: Path) -> Tuple[int, str]:
     config_path = Path(outfile_path).with_name("config.txt")
     if not config_path.is_file():
@@ -187,6 +290,95 @@ def delete_sibling_config(outfile_path: Path) -> Tuple[int, str]:
         return 0, f"{config_path}: {exc}"
 
 
+def parse_target(
+    target: Tuple[str, str, Path],
+    manifest_row: Optional[Dict[str, str]],
+    delete_configs: bool,
+) -> Tuple[Optional[Tuple[Dict[str, object], array]], int, str]:
+    """
+    One out.pdbqt as (row base, affinities) or None if it has no poses, plus
+    (configs deleted, delete error). Poses are numbered 1..n in file order,
+    so shipping the affinities as a packed array('d') is enough; the parent
+    expands them into rows.
+    """
+    receptor, ligand_dir, p = target
+    p = Path(p)
+    # A missing file just fails to open; no separate is_file() stat
+    poses = parse_vina_pdbqt(p)
+    if not poses:
+        return None, 0, ""
+    part = (
+        score_row_base(receptor, ligand_dir, p, manifest_row),
+        array("d", [aff for _, aff in poses]),
+    )
+    deleted = 0
+    delete_error = ""
+    if delete_configs:
+        deleted, delete_error = delete_sibling_config(p)
+    return part, deleted, delete_error
+
+
+def _parse_batch(batch, delete_configs: bool):
+    """Worker entry point: parse_target over a batch; a failing file yields its error instead."""
+    results = []
+    for target, manifest_row in batch:
+        try:
+            results.append((*parse_target(target, manifest_row, delete_configs), ""))
+        except Exception as e:
+            results.append((None, 0, "", str(e)))
+    return results
+
+
+def cpu_count_cgroup_aware():
+    """Respect cgroup/LSF limits; fall back to os.cpu_count()."""
+    try:
+        n = len(os.sched_getaffinity(0))
+    except Exception:
+        n = os.cpu_count() or 1
+    # LSF often sets this; honor it if present
+    lsf_n = os.environ.get("LSB_DJOB_NUMPROC")
+    if lsf_n:
+        try:
+            n = min(n, int(lsf_n))
+        except ValueError:
+            pass
+    return max(1, n)
+
+
+def parse_batch_size(n_targets: int, workers: int, cap: int = 256) -> int:
+    """About four batches per worker, capped so progress still updates on big dirs."""
+    return max(1, min(cap, n_targets // (max(1, workers) * 4)))
+
+
+def iter_parsed_batches(batches, workers: int, delete_configs: bool):
+    """
+    Yield _parse_batch results as batches finish; workers <= 1 parses inline.
+    At most 4 batches per worker are in flight, pulled from batches only as
+    slots free up, so neither batches nor futures are all built up front.
+    """
+    if workers <= 1:
+        for batch in batches:
+            yield _parse_batch(batch, delete_configs)
+        return
+    max_in_flight = workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        pending = set()
+        batches = iter(batches)
+        while True:
+            for batch in batches:
+                pending.add(ex.submit(_parse_batch, batch, delete_configs))
+                if len(pending) >= max_in_flight:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                try:
+                    yield fut.result()
+                except Exception as e:
+                    print(f"❌ Worker error: {e}")
+
+
 def process_one_dir(
     results_dir: Path,
     workers: int,
@@ -204,13 +396,10 @@ def process_one_dir(
         targets = parse_log_to_targets(results_dir, log_path)
     elif fallback_crawl:
         print(f"🐢 {results_dir.name}: no log; crawling …")
-        for root, dirs, files in os.walk(results_dir):
-            dirs[:] = [x for x in dirs if not x.startswith(".")]
-            if "out.pdbqt" in files:
-                p = Path(root) / "out.pdbqt"
-                receptor = p.parent.parent.name
-                ligdir = p.parent.name
-                targets.append((receptor, ligdir, p))
+        for outfile in find_outfiles(str(results_dir), "out.pdbqt"):
+            ligdir_path = os.path.dirname(outfile)
+            receptor = os.path.basename(os.path.dirname(ligdir_path))
+            targets.append((receptor, os.path.basename(ligdir_path), Path(outfile)))
     else:
         print(f"⏭️  {results_dir.name}: no matching run_log_; skipping (use --fallback-crawl to include).")
         return []
@@ -219,35 +408,24 @@ def process_one_dir(
         print(f"⚠️ {results_dir.name}: 0 candidate out.pdbqt")
         return []
 
-    rows_buffer = []
+    # Rows grouped by receptor; each small group is sorted on its own at the end
+    by_receptor: Dict[str, List[Dict[str, object]]] = defaultdict(list)
     processed = 0
     hits = 0
     configs_deleted = 0
     config_delete_errors = 0
-    lock = threading.Lock()
-
-    def work(tup):
-        receptor, ligand_dir, p = tup
-        if not Path(p).is_file():
-            return [], 0, ""
-        poses = parse_vina_pdbqt(p)
-        if not poses:
-            return [], 0, ""
-        rows = build_score_rows(receptor, ligand_dir, Path(p), poses, manifest_map.get(ligand_dir))
-        deleted = 0
-        delete_error = ""
-        if delete_configs:
-            deleted, delete_error = delete_sibling_config(Path(p))
-        return rows, deleted, delete_error
-
-    print(f"🚀 {results_dir.name}: parsing {len(targets)} files with {workers} threads …")
-    with ThreadPoolExecutor(max_workers=workers) as ex:
-        futs = [ex.submit(work, t) for t in targets]
-        for fut in as_completed(futs):
-            try:
-                part, deleted, delete_error = fut.result()
-            except Exception as e:
-                print(f"❌ Worker error: {e}")
+    next_beat = heartbeat
+
+    # Each target travels with its own manifest row, so workers never need the whole map
+    items = ((t, manifest_map.get(t[1])) for t in targets)
+    batch_size = parse_batch_size(len(targets), workers)
+    batches = iter(lambda: list(islice(items, batch_size)), [])
+
+    print(f"🚀 {results_dir.name}: parsing {len(targets)} files with {workers} processes …")
+    for results in iter_parsed_batches(batches, workers, delete_configs):
+        for part, deleted, delete_error, worker_error in results:
+            if worker_error:
+                print(f"❌ Worker error: {worker_error}")
                 continue
             processed += 1
             configs_deleted += deleted
@@ -256,12 +434,14 @@ def process_one_dir(
                 print(f"\n⚠️ Could not delete config.txt: {delete_error}")
             if part:
                 hits += 1
-                with lock:
-                    rows_buffer.extend(part)
-            if processed % heartbeat == 0:
-                pct = int(processed * 100 / max(1, len(targets)))
-                sys.stdout.write(f"\r🔎 {results_dir.name}: {processed}/{len(targets)} ({pct}%)  files_with_results={hits}")
-                sys.stdout.flush()
+                base, affinities = part
+                intern_shared_strings(base)
+                by_receptor[base["Receptor"]].extend(expand_score_rows(base, enumerate(affinities, 1)))
+        if processed >= next_beat:
+            next_beat = processed - processed % heartbeat + heartbeat
+            pct = int(processed * 100 / max(1, len(targets)))
+            sys.stdout.write(f"\r🔎 {results_dir.name}: {processed}/{len(targets)} ({pct}%)  files_with_results={hits}")
+            sys.stdout.flush()
 
     if delete_configs:
         cleanup_note = f"; deleted config.txt={configs_deleted}"
@@ -270,13 +450,38 @@ def process_one_dir(
     else:
         cleanup_note = "; kept config.txt files"
     print(f"\n✅ {results_dir.name}: parsed {processed} files; {hits} had results{cleanup_note}.")
+    rows_buffer = []
+    for receptor in sorted(by_receptor):
+        group = by_receptor[receptor]
+        group.sort(key=itemgetter("Binding_Affinity"))
+        rows_buffer.extend(group)
     return rows_buffer
 
+def write_sorted_scores(results_dir: Path, ts: str, rows: List[Dict[str, object]]) -> Path:
+    """Sort rows by receptor then affinity and write the per-dir CSV through one buffered handle."""
+    # Receptor is a str and Binding_Affinity a float from build_score_rows, so no casts in the key;
+    # rows from process_one_dir arrive already in this order, which timsort passes through in one scan
+    rows.sort(key=itemgetter("Receptor", "Binding_Affinity"))
+    per_dir_csv = results_dir.parent / f"{results_dir.name}_{ts}_vina_docking_scores_sorted.csv"
+    with open(per_dir_csv, "w", newline="", encoding="utf-8", buffering=1 << 20) as fh:
+        if HAVE_PANDAS and len(rows) >= PANDAS_CSV_MIN_ROWS:
+            # dtype=object keeps each cell's Python value, so ints mixed with None
+            # (the *Index columns) are not widened to float and written as "1.0";
+            # output is byte-identical to the csv.DictWriter branch
+            frame = pd.DataFrame(rows, columns=OUTPUT_COLUMNS, dtype=object)
+            frame.to_csv(fh, index=False, lineterminator="\r\n")
+        else:
+            w = csv.DictWriter(fh, fieldnames=OUTPUT_COLUMNS)
+            w.writeheader()
+            w.writerows(rows)
+    return per_dir_csv
+
 # ==========================================================
 # Main entry point
 # ==========================================================
 def main():
     args = parse_cli()
+    workers = args.workers if args.workers > 0 else cpu_count_cgroup_aware()
 
     # Non-interactive mode for LSF or automation
     if args.dir:
@@ -288,7 +493,7 @@ def main():
         ts = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         rows = process_one_dir(
             results_dir,
-            args.workers,
+            workers,
             args.heartbeat,
             args.fallback_crawl,
             delete_configs=not args.keep_configs,
@@ -297,12 +502,7 @@ def main():
             print(f"⚠️ No results parsed in {results_dir.name}")
             sys.exit(0)
 
-        rows.sort(key=lambda r: (str(r["Receptor"]), float(r["Binding_Affinity"])))
-        per_dir_csv = results_dir.parent / f"{results_dir.name}_{ts}_vina_docking_scores_sorted.csv"
-        with open(per_dir_csv, "w", newline="", encoding="utf-8") as fh:
-            w = csv.DictWriter(fh, fieldnames=OUTPUT_COLUMNS)
-            w.writeheader()
-            w.writerows(rows)
+        per_dir_csv = write_sorted_scores(results_dir, ts, rows)
         print(f"📊 Per-dir CSV → {per_dir_csv}")
         sys.exit(0)
 
@@ -318,8 +518,6 @@ def main():
     for p in selected:
         print("  -", p)
 
-    default_workers = min(64, (os.cpu_count() or 8) * 2)
-    workers = args.workers or default_workers
     heartbeat = max(50, args.heartbeat)
 
     ts = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
@@ -335,12 +533,7 @@ def main():
         )
         if not rows:
             continue
-        rows.sort(key=lambda r: (str(r["Receptor"]), float(r["Binding_Affinity"])))
-        per_dir_csv = results_dir.parent / f"{results_dir.name}_{ts}_vina_docking_scores_sorted.csv"
-        with open(per_dir_csv, "w", newline="", encoding="utf-8") as fh:
-            w = csv.DictWriter(fh, fieldnames=OUTPUT_COLUMNS)
-            w.writeheader()
-            w.writerows(rows)
+        per_dir_csv = write_sorted_scores(results_dir, ts, rows)
         print(f"📊 Per-dir CSV → {per_dir_csv}")
         all_rows.extend(rows)
 
@@ -14,8 +14,10 @@ LEGACY_POSE_RE = re.compile(r"^(?P<base>.+?)(?:__|_)(?P<pose>pose\d+)$", re.IGNO
 def _to_index(tag: str) -> Optional[int]:
     if not tag:
         return None
-    digits = re.search(r"(\d+)$", tag)
-    return int(digits.group(1)) if digits else None
+    start = len(tag)
+    while start and tag[start - 1].isdecimal():
+        start -= 1
+    return int(tag[start:]) if start < len(tag) else None
 
 
 def parse_ligand_variant(name: str) -> Dict[str, Any]:
@@ -32,10 +34,12 @@ def parse_ligand_variant(name: str) -> Dict[str, Any]:
         "ProtomerIndex": None,
         "TautomerIndex": None,
     }
-    if not original:
+    # Both patterns end in digits; plain names (the common case) skip the regexes
+    if not original[-1:].isdecimal():
         return parsed
 
-    match = NEW_STYLE_RE.match(original)
+    lowered = original.lower()
+    match = NEW_STYLE_RE.match(original) if "_c" in lowered else None
     if match:
         protomer = match.group("protomer")
         tautomer = match.group("tautomer")
@@ -54,7 +58,7 @@ def parse_ligand_variant(name: str) -> Dict[str, Any]:
         )
         return parsed
 
-    match = LEGACY_POSE_RE.match(original)
+    match = LEGACY_POSE_RE.match(original) if "_pose" in lowered else None
     if match:
         pose_tag = match.group("pose")
         parsed.update(
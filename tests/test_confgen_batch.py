@@ -49,6 +49,36 @@ class ConfgenBatchTests(unittest.TestCase):
         self.assertIn("--enumerate-protomers", cmd)
         self.assertIn("--max-tautomers 5", cmd)
         self.assertIn("--max-transforms 250", cmd)
+        self.assertIn("--mmff-threads 1", cmd)
+
+    def test_write_array_lsf_dispatches_targets_by_job_index(self):
+        module = load_script_module("1B_confgen_batch.py", "confgen_batch_array")
+
+        class Args:
+            queue = "general"
+            project = "demo"
+            workers = 4
+            mem_per_core = "1000"
+            walltime = "01:00"
+            email = ""
+            env_activate = 'export PATH="$HOME/bin:$PATH"'
+            obabel_bin = ""
+            max_concurrent = 2
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            module.HERE = Path(tmpdir)
+            out = module.write_array_lsf(
+                [("Ligands_A", '"$PYBIN" 1_ConformerGeneration.py --folder "Ligands_A"\n'),
+                 ("Ligands_B", '"$PYBIN" 1_ConformerGeneration.py --folder "Ligands_B"\n')],
+                Args(),
+            )
+            text = out.read_text()
+
+        self.assertIn('#BSUB -J "confgen_array[1-2]%2"', text)
+        self.assertIn("logs/confgen_array_%I_%J.out", text)
+        self.assertIn('case "$LSB_JOBINDEX" in', text)
+        self.assertIn('  2)\n    echo "Target: Ligands_B"', text)
+        self.assertIn('export PATH="$HOME/bin:$PATH"', text)
 
     def test_discover_csv_folders_finds_only_directories_with_csv(self):
         module = load_script_module("1B_confgen_batch.py", "confgen_batch_discovery")
@@ -93,6 +123,15 @@ class ConfgenBatchTests(unittest.TestCase):
         self.assertEqual(sdf_found, ["Ligands_split_001", "Ligands_split_002"])
         self.assertEqual(smiles_found, ["Smiles_batch_001"])
 
+    def test_parse_selection_accepts_indices_ranges_and_name_patterns(self):
+        module = load_script_module("1B_confgen_batch.py", "confgen_batch_selection")
+        names = ["Ligands_CPD1", "Ligands_CPD2", "Ligands_CPD31", "Smiles_batch_001"]
+
+        self.assertEqual(module.parse_index_list("4, 2-1 ,9,x", len(names)), [0, 1, 3])
+        self.assertEqual(module.parse_selection("ligands_cpd3*", names), [2])
+        self.assertEqual(module.parse_selection("1,smiles_*", names), [0, 3])
+        self.assertEqual(module.parse_selection("nope*", names), [])
+
     def test_csv_columns_for_target_uses_per_folder_map(self):
         module = load_script_module("1B_confgen_batch.py", "confgen_batch_csv_map")
         column_map = {
@@ -126,6 +126,48 @@ class ParseScoresTests(unittest.TestCase):
         self.assertEqual(rows[0]["Formula"], "C2H6O")
         self.assertEqual(rows[0]["SourceInputType"], "csv")
 
+    def test_parse_vina_pdbqt_reads_result_remarks_only(self):
+        module = load_script_module("4_ParseScores.py", "parse_scores_module_pdbqt")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            outfile = Path(tmpdir) / "out.pdbqt"
+            outfile.write_text(
+                "MODEL 1\n"
+                "REMARK VINA RESULT:    -7.4      0.000      0.000\n"
+                "ATOM      1  C   LIG     1       0.000   0.000   0.000\n"
+                "REMARK  VINA RESULT: -6.9 1.2 2.3\n"
+                "REMARK INTER + INTRA: -9.1\n"
+            )
+            poses = module.parse_vina_pdbqt(outfile)
+        self.assertEqual(poses, [(1, -7.4), (2, -6.9)])
+
+    def test_split_ok_line_matches_log_formats(self):
+        module = load_script_module("4_ParseScores.py", "parse_scores_module_log")
+        self.assertEqual(module.split_ok_line("✅ obj01_p01 → ReceptorA.pdbqt\n"), ("obj01_p01", "ReceptorA.pdbqt"))
+        self.assertEqual(module.split_ok_line("obj 02 -> 3eky_chainA"), ("obj 02", "3eky_chainA"))
+        self.assertEqual(module.split_ok_line("✅ lig a → b → c.pdbqt"), ("lig a → b", "c.pdbqt"))
+        self.assertIsNone(module.split_ok_line("✅ lig → Receptor A"))
+        self.assertIsNone(module.split_ok_line("❌ lig vs ReceptorA: failed"))
+
+    def test_pandas_scores_csv_matches_csv_writer(self):
+        module = load_script_module("4_ParseScores.py", "parse_scores_module_pandas_csv")
+        if not module.HAVE_PANDAS:
+            self.skipTest("pandas not installed")
+        rows = module.build_score_rows(
+            "ReceptorA",
+            "obj01_p01_t02_c005",
+            Path('/tmp/odd, "name".pdbqt'),
+            [(1, -7.4), (2, -6.95), (3, -10.0)],
+            manifest_row={"CanonicalSMILES": "C(=O)O,N", "ExactMolWt": "46.041864812"},
+        )
+        rows += module.build_score_rows("ReceptorB", "plain_ligand", Path("/tmp/out.pdbqt"), [(1, 0.1 + 0.2)])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            results_dir = Path(tmpdir) / "Docking_Results_Test"
+            with mock.patch.object(module, "HAVE_PANDAS", False):
+                stdlib_csv = module.write_sorted_scores(results_dir, "stdlib", list(rows))
+            with mock.patch.object(module, "PANDAS_CSV_MIN_ROWS", 0):
+                pandas_csv = module.write_sorted_scores(results_dir, "pandas", list(rows))
+            self.assertEqual(pandas_csv.read_bytes(), stdlib_csv.read_bytes())
+
 
 class ConformerInputIdentityTests(unittest.TestCase):
     @classmethod
@@ -370,6 +412,34 @@ class DockingRunnerTests(unittest.TestCase):
             self.assertEqual(len(jobs), 1)
             self.assertTrue(jobs[0]["receptor_file"].endswith("3eky_receptor.pdbqt"))
 
+    def test_receptor_chunks_do_not_span_receptors(self):
+        module = load_script_module("3_Complete_batch_docking.py", "docking_runner_module_chunks")
+        jobs = [
+            module.DockingJob(f"lig{i}", f"lig{i}.pdbqt", rec, "out", "log", 0, 0, 0, rec, 9, "vina", {})
+            for rec, count in (("A.pdbqt", 5), ("B.pdbqt", 2))
+            for i in range(count)
+        ]
+
+        chunks = list(module.receptor_chunks(iter(jobs), 2))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1, 2])
+        self.assertEqual([{job.receptor_file for job in chunk} for chunk in chunks],
+                         [{"A.pdbqt"}, {"A.pdbqt"}, {"A.pdbqt"}, {"B.pdbqt"}])
+
+    def test_job_manifest_round_trip(self):
+        module = load_script_module("3_Complete_batch_docking.py", "docking_runner_module_manifest")
+        job = module.DockingJob("lig1", "lig1.pdbqt", "A.pdbqt", "out.pdbqt", "log.txt",
+                                1.0, 2.0, 3.0, "A", 9, "vina", {"LigandVariant": "lig1"})
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "jobs.pkl"
+            module.write_job_manifest(path, {"results_dir": tmpdir, "messages": [], "jobs": [job]})
+            plan = module.read_job_manifest(path)
+
+        self.assertEqual(plan["results_dir"], tmpdir)
+        self.assertEqual(len(plan["jobs"]), 1)
+        self.assertEqual(plan["jobs"][0].receptor_file, "A.pdbqt")
+        self.assertEqual(plan["jobs"][0].ligand_metadata, {"LigandVariant": "lig1"})
+
     def test_missing_vina_message_is_clear(self):
         module = load_script_module("3_Complete_batch_docking.py", "docking_runner_module_missing")
         with self.assertRaises(SystemExit) as ctx:
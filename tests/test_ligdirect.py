@@ -0,0 +1,89 @@
+import csv
+import importlib.util
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_ligdirect_module():
+    spec = importlib.util.spec_from_file_location("ligdirect_module", REPO_ROOT / "0_LigDirect.py")
+    module = importlib.util.module_from_spec(spec)
+    assert spec.loader is not None
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+RECORDS = (
+    "LigA\n  CDK     07142026\n\n  0  0  0  0  0  0            999 V2000\nM  END\n$$$$\n",
+    "Lig B\n  CDK     07142026\n\n  0  0  0  0  0  0            999 V2000\nM  END\n$$$$\n",
+    "LigC\n  CDK     07142026\n\n  0  0  0  0  0  0            999 V2000\nM  END\n$$$$\n",
+)
+
+
+class LigDirectTests(unittest.TestCase):
+    def setUp(self):
+        self.module = load_ligdirect_module()
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        self.input_sdf = self.root / "library.sdf"
+        self.input_sdf.write_text("".join(RECORDS), encoding="utf-8")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_split_copies_record_bytes_verbatim(self):
+        outdir = self.root / "Ligand_demo"
+        count = self.module.split_sdf(self.input_sdf, outdir, "0_", 4, keep_names=True)
+
+        self.assertEqual(count, 3)
+        self.assertEqual((outdir / "0_0002_Lig_B.sdf").read_text(encoding="utf-8"), RECORDS[1])
+        with open(outdir / "manifest.csv", newline="") as fh:
+            rows = list(csv.reader(fh))
+        self.assertEqual(rows[0], ["index", "orig_name", "output_file"])
+        self.assertEqual(rows[1:], [
+            ["1", "LigA", "0_0001_LigA.sdf"],
+            ["2", "Lig B", "0_0002_Lig_B.sdf"],
+            ["3", "LigC", "0_0003_LigC.sdf"],
+        ])
+
+    def test_parallel_split_keeps_global_record_numbering(self):
+        outdir = self.root / "Ligand_parallel"
+        count = self.module.split_sdf(self.input_sdf, outdir, "0_", 4, keep_names=False, workers=2)
+
+        self.assertEqual(count, 3)
+        self.assertEqual(
+            sorted(p.name for p in outdir.glob("*.sdf")),
+            ["0_0001_mol_0001.sdf", "0_0002_mol_0002.sdf", "0_0003_mol_0003.sdf"],
+        )
+
+    def test_small_batches_keep_record_order(self):
+        self.module.SPLIT_BATCH_RECORDS = 1
+        outdir = self.root / "Ligand_batches"
+        count = self.module.split_sdf(self.input_sdf, outdir, "0_", 4, keep_names=True, workers=2)
+
+        self.assertEqual(count, 3)
+        self.assertEqual((outdir / "0_0003_LigC.sdf").read_text(encoding="utf-8"), RECORDS[2])
+        with open(outdir / "manifest.csv", newline="") as fh:
+            rows = list(csv.reader(fh))
+        self.assertEqual([row[0] for row in rows[1:]], ["1", "2", "3"])
+
+    def test_delimiter_must_start_a_line(self):
+        record = (
+            "LigD\n  CDK     07142026\n\n  0  0  0  0  0  0            999 V2000\nM  END\n"
+            "> <note>\nprice $$$$\n\n$$$$\n"
+        )
+        self.input_sdf.write_text(record + RECORDS[0], encoding="utf-8")
+        outdir = self.root / "Ligand_delim"
+        count = self.module.split_sdf(self.input_sdf, outdir, "0_", 4, keep_names=True)
+
+        self.assertEqual(count, 2)
+        self.assertEqual((outdir / "0_0001_LigD.sdf").read_text(encoding="utf-8"), record)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -64,6 +64,31 @@ class ServerDocksTests(unittest.TestCase):
 
         self.assertEqual(found[:2], ["Receptors", "receptor_set_alt"])
 
+    def test_array_lsf_reads_pairs_from_jobs_table(self):
+        module = load_script_module("3B_ServerDocks.py", "serverdocks_array")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            module.HERE = Path(tmpdir)
+            template = module.build_lsf_template("q", "proj", "12:00", 4, 1000, "")
+            jobs = [
+                ("Receptors_CPD1", "Receptors", "Ligands_CPD1_Ligands", "centers.csv"),
+                ("Receptors_CPD2", "Receptors", "Ligands_CPD2_Ligands", "centers.csv"),
+            ]
+            lsf = module.write_array_lsf(jobs, 9, template).read_text()
+            table = (module.HERE / "vina_jobs.tsv").read_text().splitlines()
+
+        self.assertIn('#BSUB -J "vina[1-2]%16"', lsf)
+        self.assertIn('--receptors "$RDIR"', lsf)
+        self.assertEqual(table[0], "idx\treceptor_dir\tligand_dir\tcenters_csv")
+        self.assertEqual(table[2], "2\tReceptors\tLigands_CPD2_Ligands\tcenters.csv")
+
+    def test_single_index_prompt_matches_full_parser(self):
+        module = load_script_module("3B_ServerDocks.py", "serverdocks_single_index")
+        self.assertEqual(module.parse_single_index("3", 5), 2)
+        self.assertEqual(module.parse_single_index(" 2-2 ", 5), 1)
+        self.assertIsNone(module.parse_single_index("6", 5))
+        self.assertIsNone(module.parse_single_index("1,2", 5))
+        self.assertIsNone(module.parse_single_index("", 5))
+
 
 if __name__ == "__main__":
     unittest.main()